@@ -0,0 +1,97 @@
+"""Serialization cost of the dashboard responses at growing client counts.
+
+Compares the response_model path (validate ProcessedDashboardData, dump to
+JSON-able data, json.dumps, as FastAPI does) with the orjson path the
+handlers now use, for the dashboard payload and for /api/clients pages.
+
+    python benchmarks/bench_serialization.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import server
+
+
+def synthetic_clients(n: int, seed: int = 0) -> pd.DataFrame:
+    """n clients spread over n/2000 branches and n/200 COs"""
+    rng = np.random.default_rng(seed)
+    branches = np.array([f"Branch {i:04d}" for i in range(max(n // 2000, 1))], dtype=object)
+    cos = np.array([f"CO {i:05d}" for i in range(max(n // 200, 1))], dtype=object)
+    days = pd.date_range('2024-01-01', periods=31).strftime(server.EXCEL_DATE_FORMAT).to_numpy(dtype=object)
+    co = rng.integers(0, len(cos), n)
+    return pd.DataFrame({
+        'srNo': np.arange(1, n + 1),
+        'memberId': np.char.add('M', np.arange(n).astype(str)).astype(object),
+        'name': np.full(n, 'Client', dtype=object),
+        'branch': branches[co % len(branches)],
+        'co': cos[co],
+        'dueTotal': rng.integers(0, 5000, n).astype(float),
+        'currentRecTotal': rng.integers(0, 5000, n).astype(float),
+        'totalOverdue': rng.integers(0, 800, n).astype(float),
+        'currentAdvance': rng.integers(0, 50, n).astype(float),
+        'openingAdvance': rng.integers(0, 50, n).astype(float),
+        'disbDate': days[rng.integers(0, len(days), n)],
+        'lastInstallDate': days[rng.integers(0, len(days), n)],
+        'olp': rng.integers(0, 90000, n).astype(float),
+        'cellNo': np.full(n, '03000000000', dtype=object),
+    })[server.CLIENT_FIELDS]
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def response_model_body(model, payload) -> bytes:
+    content = jsonable_encoder(model.model_validate(payload))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def run(n: int, repeat: int):
+    frame = synthetic_clients(n)
+    metrics = server.compute_group_metrics(frame, frame.iloc[:0], '17-Jan-24', '18-Jan-24', server.GROUP_VIEWS)
+    branch_metrics = [m.model_dump() for m in metrics['Branch'].values()]
+    co_metrics = [m.model_dump() for m in metrics['CO'].values()]
+    total_metrics = {"totalActiveClients": n}
+    payload = {"totalMetrics": total_metrics, "branchMetrics": branch_metrics, "coMetrics": co_metrics}
+
+    results = {
+        'dashboard/response_model': best_of(lambda: response_model_body(server.ProcessedDashboardData, payload), repeat),
+        'dashboard/orjson': best_of(lambda: server.encode_dashboard_data(total_metrics, branch_metrics, co_metrics), repeat),
+        'clients/response_model': best_of(lambda: response_model_body(server.ClientPage, {
+            "total": n, "nextCursor": None, "clients": server.frame_to_clients(frame)
+        }), repeat),
+        'clients/orjson': best_of(lambda: server.encode_client_page(n, None, frame), repeat),
+    }
+    print(f"\n{n:>9,} clients ({len(branch_metrics)} branches, {len(co_metrics)} COs)")
+    for name, seconds in results.items():
+        print(f"  {name:<26} {seconds * 1000:>10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    for n in args.sizes:
+        run(n, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
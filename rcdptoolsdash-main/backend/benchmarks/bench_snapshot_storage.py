@@ -0,0 +1,113 @@
+"""Snapshot storage size and load latency, documents layout vs GridFS Arrow blobs.
+
+Offline it compares the BSON the documents layout writes (one row per client
+and per aggregate) with the zstd Arrow IPC blobs of SNAPSHOT_STORAGE=gridfs,
+and the time to turn each back into the client frame. With --live both
+layouts are also stored and loaded through the server against the Mongo at
+MONGO_URL/DB_NAME, which should be a scratch database.
+
+    python benchmarks/bench_snapshot_storage.py [--sizes 10000 100000 1000000] [--live]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import bson
+import pandas as pd
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import server
+from bench_serialization import best_of, synthetic_clients
+
+
+def snapshot(n: int):
+    frame = synthetic_clients(n)
+    metrics = server.compute_group_metrics(frame, frame.iloc[:0], '17-Jan-24', '18-Jan-24', server.GROUP_VIEWS)
+    metrics_by_view = {view: [m.model_dump() for m in metrics[view].values()] for view in server.GROUP_VIEWS}
+    return frame, metrics_by_view
+
+
+def run_offline(n: int, repeat: int):
+    frame, metrics_by_view = snapshot(n)
+    snapshot_id = str(uuid.uuid4())
+    client_rows = frame.to_dict('records')
+    for row in client_rows:
+        row.update(_id=bson.ObjectId(), snapshot_id=snapshot_id)
+    metric_rows = [
+        {"_id": bson.ObjectId(), "snapshot_id": snapshot_id, "view": view, "position": position, **row}
+        for view, rows in metrics_by_view.items() for position, row in enumerate(rows)
+    ]
+    documents = b''.join(bson.encode(row) for row in client_rows)
+    metric_documents = b''.join(bson.encode(row) for row in metric_rows)
+    blobs = server.snapshot_blob_tables(metrics_by_view, frame)
+
+    def documents_load():
+        rows = bson.decode_all(documents)
+        for row in rows:
+            del row["_id"], row["snapshot_id"]
+        return pd.DataFrame(rows, columns=server.CLIENT_FIELDS)
+
+    def blob_load():
+        return server.decode_snapshot_blob(blobs["clients"]).to_pandas()
+
+    pd.testing.assert_frame_equal(documents_load(), blob_load(), check_dtype=False)
+    print(f"\n{n:>9,} clients")
+    print(f"  {'documents/bytes':<26} {(len(documents) + len(metric_documents)) / 2**20:>10.2f} MiB")
+    print(f"  {'gridfs/bytes':<26} {sum(map(len, blobs.values())) / 2**20:>10.2f} MiB")
+    print(f"  {'documents/decode':<26} {best_of(documents_load, repeat) * 1000:>10.1f} ms")
+    print(f"  {'gridfs/decode':<26} {best_of(blob_load, repeat) * 1000:>10.1f} ms")
+
+
+async def run_live(n: int, repeat: int):
+    frame, metrics_by_view = snapshot(n)
+    total_metrics = {"totalActiveClients": n}
+    for storage in ('documents', 'gridfs'):
+        server.SNAPSHOT_STORAGE = storage
+        snapshot_id = str(uuid.uuid4())
+        start = time.perf_counter()
+        await server.store_snapshot(snapshot_id, total_metrics, metrics_by_view, frame)
+        stored = time.perf_counter() - start
+        latest = server.SnapshotRef(snapshot_id, {"snapshot_id": snapshot_id})
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await server.load_snapshot_clients(latest)
+            await server.load_snapshot_aggregates(latest, server.FULL_DASHBOARD_QUERY)
+            timings.append(time.perf_counter() - start)
+        print(f"  {storage + '/store':<26} {stored * 1000:>10.1f} ms")
+        print(f"  {storage + '/load':<26} {min(timings) * 1000:>10.1f} ms")
+
+        await server.db.dashboard_data.delete_one({"snapshot_id": snapshot_id})
+    server.ORPHAN_ROWS_GRACE = server.timedelta(0)
+    await server.prune_snapshots()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--live', action='store_true', help='also store and load both layouts through MONGO_URL')
+    args = parser.parse_args()
+
+    async def live():
+        for n in args.sizes:
+            print(f"\n{n:>9,} clients, live")
+            await run_live(n, args.repeat)
+
+    for n in args.sizes:
+        run_offline(n, args.repeat)
+    if args.live:
+        asyncio.run(live())
+
+
+if __name__ == '__main__':
+    main()
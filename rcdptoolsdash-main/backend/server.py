@@ -1,18 +1,46 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Header, Request
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from python_multipart.multipart import MultipartParser, parse_options_header
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument, ReplaceOne
+from pymongo.errors import BulkWriteError, OperationFailure
 import os
 import logging
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Union, NamedTuple, Callable, Awaitable, AsyncIterator
 import uuid
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import pandas as pd
+import numpy as np
 import openpyxl
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 import io
-from fastapi.responses import JSONResponse
+import base64
+import tempfile
+import csv
+import hashlib
+import threading
+from collections import OrderedDict
+import itertools
+import operator
+import time
+import mmap
+import shutil
+import orjson
+import gzip
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 
 ROOT_DIR = Path(__file__).parent
@@ -76,13 +104,89 @@ class DashboardMetrics(BaseModel):
     openingAdvanceAmount: float
     olpAmount: float
     recoveryPercentage: float
-    clients: List[ExcelData] = []
 
 class ProcessedDashboardData(BaseModel):
     totalMetrics: Dict[str, Any]
     branchMetrics: List[DashboardMetrics]
     coMetrics: List[DashboardMetrics]
 
+class SnapshotMetricsHistory(BaseModel):
+    snapshotId: str
+    timestamp: datetime
+    metrics: List[DashboardMetrics]
+
+class TrendPoint(DashboardMetrics):
+    date: str
+
+class ClientDelta(BaseModel):
+    memberId: str
+    name: str
+    branch: str
+    co: str
+    status: str
+    dueDelta: float
+    recoveredDelta: float
+    overdueDelta: float
+    advanceDelta: float
+
+class GroupDelta(BaseModel):
+    key: str
+    matchedClients: int
+    newClients: int
+    lostClients: int
+    improvedClients: int
+    slippedClients: int
+    curedClients: int
+    rolledClients: int
+    dueDelta: float
+    recoveredDelta: float
+    overdueDelta: float
+    advanceDelta: float
+
+class ClientDeltaPage(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    clients: List[ClientDelta]
+
+class ClientPage(BaseModel):
+    total: int
+    nextCursor: Optional[str] = None
+    clients: List[ExcelData]
+
+class TopOverdueGroup(BaseModel):
+    key: str
+    overdueClients: int
+    clients: List[ExcelData]
+
+class OverduePercentiles(BaseModel):
+    key: str
+    overdueClients: int
+    percentiles: Dict[str, float]
+
+class RecoveryWindowMetrics(BaseModel):
+    key: str
+    recoveredClients: int
+    recoveredAmount: float
+
+class RecoveryWindowData(BaseModel):
+    view: str
+    fromDate: str
+    toDate: str
+    totalRecoveredClients: int
+    totalRecoveredAmount: float
+    groups: List[RecoveryWindowMetrics]
+
+class UploadJobStatus(BaseModel):
+    jobId: str
+    phase: str
+    rowsProcessed: int = 0
+    etaSeconds: Optional[float] = None
+    snapshotId: Optional[str] = None
+    error: Optional[str] = None
+    createdAt: datetime
+    updatedAt: datetime
+
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
@@ -100,233 +204,1976 @@ async def get_status_checks():
     status_checks = await db.status_checks.find().to_list(1000)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
-def process_excel_file(file_content: bytes, file_name: str) -> List[ExcelData]:
-    """Process Excel file and extract data similar to the HTML version logic"""
+# Positional layout of the branch export (0-based column indexes)
+EXCEL_TEXT_COLUMNS = {'memberId': (1, ''), 'name': (2, ''), 'branch': (4, 'Unknown'), 'co': (5, 'Unknown'), 'cellNo': (31, '')}
+EXCEL_FLOAT_COLUMNS = {'dueTotal': 10, 'currentRecTotal': 14, 'openingAdvance': 17, 'currentAdvance': 18,
+                       'totalOverdue': 21, 'olp': 27}
+EXCEL_DATE_COLUMNS = {'disbDate': 23, 'lastInstallDate': 26}
+EXCEL_DATE_FORMAT = '%d-%b-%y'
+CLIENT_FIELDS = list(ExcelData.model_fields)
+
+EXCEL_USED_COLUMNS = sorted([idx for idx, _ in EXCEL_TEXT_COLUMNS.values()]
+                            + list(EXCEL_FLOAT_COLUMNS.values()) + list(EXCEL_DATE_COLUMNS.values()))
+EXCEL_SKIPPED_ROWS = 3  # header row plus the two rows the HTML version skips
+
+# Streaming ingestion settings
+EXCEL_CHUNK_ROWS = int(os.environ.get('EXCEL_CHUNK_ROWS', '50000'))
+EXCEL_STREAMING_THRESHOLD = int(os.environ.get('EXCEL_STREAMING_THRESHOLD_MB', '16')) * 1024 * 1024
+
+def _column(data: pd.DataFrame, idx: int) -> Optional[pd.Series]:
+    """Return the column at sheet position idx, or None when the sheet is narrower"""
+    return data[idx] if idx in data.columns else None
+
+def _coerce_text(series: Optional[pd.Series], length: int, default: str) -> np.ndarray:
+    if series is None:
+        return np.full(length, default, dtype=object)
+    values = series.astype(object)
+    return values.where(values.notna(), default).astype(str).to_numpy(dtype=object)
+
+def _coerce_float(series: Optional[pd.Series], length: int) -> np.ndarray:
+    if series is None:
+        return np.zeros(length, dtype=np.float64)
+    return pd.to_numeric(series, errors='coerce').fillna(0.0).to_numpy(dtype=np.float64)
+
+def _coerce_date(series: Optional[pd.Series], length: int) -> np.ndarray:
+    if series is None:
+        return np.full(length, '', dtype=object)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.strftime(EXCEL_DATE_FORMAT).fillna('').to_numpy(dtype=object)
+    values = series.astype(object)
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind in ('datetime', 'datetime64'):
+        return pd.to_datetime(values).dt.strftime(EXCEL_DATE_FORMAT).fillna('').to_numpy(dtype=object)
+    if kind == 'string':
+        return values.fillna('').to_numpy(dtype=object)
+    # Mixed cells (e.g. real dates next to typed-in text) still need a per-cell check
+    return np.array([
+        '' if pd.isna(v) else v.strftime(EXCEL_DATE_FORMAT) if isinstance(v, datetime) else str(v)
+        for v in values
+    ], dtype=object)
+
+def normalize_client_columns(data: pd.DataFrame, first_sr_no: int = 1, named: bool = False) -> pd.DataFrame:
+    """Coerce export columns in bulk into the ExcelData column layout.
+
+    Columns are looked up by sheet position, or by ExcelData field name when
+    named is set. Rows whose branch or CO resolves to 'Unknown' are dropped;
+    srNo keeps the position the row had in the sheet.
+    """
+    length = len(data)
+    source = (lambda name, idx: _column(data, name if named else idx))
+    if named and 'srNo' in data.columns:
+        sr_no = pd.to_numeric(data['srNo'], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+    else:
+        sr_no = np.arange(first_sr_no, first_sr_no + length, dtype=np.int64)
+    
+    columns = {'srNo': sr_no}
+    for name, (idx, default) in EXCEL_TEXT_COLUMNS.items():
+        columns[name] = _coerce_text(source(name, idx), length, default)
+    for name, idx in EXCEL_FLOAT_COLUMNS.items():
+        columns[name] = _coerce_float(source(name, idx), length)
+    for name, idx in EXCEL_DATE_COLUMNS.items():
+        columns[name] = _coerce_date(source(name, idx), length)
+    
+    frame = pd.DataFrame(columns)[CLIENT_FIELDS]
+    known = (frame['branch'] != 'Unknown') & (frame['co'] != 'Unknown')
+    return frame[known.to_numpy()].reset_index(drop=True)
+
+def frame_to_clients(frame: pd.DataFrame) -> List[ExcelData]:
+    """Materialize ExcelData rows from already-coerced columns without re-validating"""
+    return [ExcelData.model_construct(**record) for record in frame.to_dict('records')]
+
+def iter_excel_chunks(source, chunk_rows: int = EXCEL_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Stream the first sheet in read-only mode, yielding normalized chunks.
+
+    Only the used columns are pulled out of each row, into an object buffer
+    that is allocated once and reused for every chunk, so memory stays bounded
+    by chunk_rows regardless of the sheet size.
+    """
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True, keep_links=False)
     try:
-        # Read Excel file
-        df = pd.read_excel(io.BytesIO(file_content), engine='openpyxl')
-        
-        # Skip first 2 rows and process data (similar to HTML logic)
-        if len(df) <= 2:
-            raise ValueError("Excel file has insufficient data")
+        sheet = workbook.worksheets[0]
+        pick = operator.itemgetter(*EXCEL_USED_COLUMNS)
+        buffer = np.empty((chunk_rows, len(EXCEL_USED_COLUMNS)), dtype=object)
+        rows = sheet.iter_rows(min_row=EXCEL_SKIPPED_ROWS + 1, max_col=EXCEL_USED_COLUMNS[-1] + 1,
+                               values_only=True)
+        sr_no = 1
+        while True:
+            filled = 0
+            for row in itertools.islice(rows, chunk_rows):
+                buffer[filled] = pick(row)
+                filled += 1
+            if not filled:
+                break
+            raw = pd.DataFrame(buffer[:filled], columns=EXCEL_USED_COLUMNS)
+            yield normalize_client_columns(raw, first_sr_no=sr_no)
+            sr_no += filled
+            if filled < chunk_rows:
+                break
+    finally:
+        workbook.close()
+
+def read_excel_streaming(source, chunk_rows: int = EXCEL_CHUNK_ROWS) -> pd.DataFrame:
+    """Read a workbook chunk by chunk into preallocated typed column buffers"""
+    capacity = 0
+    columns: Dict[str, np.ndarray] = {}
+    filled = 0
+    for chunk in iter_excel_chunks(source, chunk_rows):
+        if filled + len(chunk) > capacity:
+            capacity = max(capacity * 2, filled + len(chunk), chunk_rows)
+            columns = {name: _grow(columns.get(name), chunk[name].dtype, capacity, filled)
+                       for name in CLIENT_FIELDS}
+        for name in CLIENT_FIELDS:
+            columns[name][filled:filled + len(chunk)] = chunk[name].to_numpy()
+        filled += len(chunk)
+    
+    if not columns:
+        raise ValueError("Excel file has insufficient data")
+    return pd.DataFrame({name: values[:filled] for name, values in columns.items()})
+
+def _grow(values: Optional[np.ndarray], dtype, capacity: int, filled: int) -> np.ndarray:
+    grown = np.empty(capacity, dtype=dtype)
+    if values is not None:
+        grown[:filled] = values[:filled]
+    return grown
+
+# Parsers accept either the raw upload bytes or the path of a spooled upload
+UploadSource = Union[bytes, str]
+
+def _file_source(source: UploadSource):
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+def _arrow_source(source: UploadSource):
+    return pa.BufferReader(source) if isinstance(source, bytes) else pa.memory_map(source)
+
+def _source_size(source: UploadSource) -> int:
+    return len(source) if isinstance(source, bytes) else os.path.getsize(source)
+
+def _source_head(source: UploadSource, size: int) -> bytes:
+    if isinstance(source, bytes):
+        return source[:size]
+    with open(source, 'rb') as f:
+        return f.read(size)
+
+def parse_excel_source(source: UploadSource) -> pd.DataFrame:
+    """Parse a workbook into normalized client columns (one row per client)"""
+    # Large workbooks are streamed instead of materialized as a full frame
+    if _source_size(source) >= EXCEL_STREAMING_THRESHOLD:
+        return read_excel_streaming(_file_source(source))
+    
+    # Read Excel file, keeping raw cell values so IDs and phone numbers are not
+    # re-typed as floats (and the result matches the streaming reader)
+    df = pd.read_excel(_file_source(source), engine='openpyxl', dtype=object)
+    
+    # Skip first 2 rows and process data (similar to HTML logic)
+    if len(df) <= 2:
+        raise ValueError("Excel file has insufficient data")
+    
+    data = df.iloc[2:]
+    data.columns = range(data.shape[1])
+    return normalize_client_columns(data)
+
+def parse_csv_source(source: UploadSource) -> pd.DataFrame:
+    """Parse a CSV export laid out like the workbook (header row plus two skipped rows).
+
+    Uses pyarrow's multithreaded reader with every column read as text, so
+    the same coercion rules apply as for workbook cells.
+    """
+    head = _source_head(source, 64 * 1024).decode('utf-8-sig', errors='replace')
+    header = next(csv.reader(io.StringIO(head)), [])
+    width = len(header)
+    table = pa_csv.read_csv(
+        _arrow_source(source),
+        read_options=pa_csv.ReadOptions(skip_rows=EXCEL_SKIPPED_ROWS, column_names=[str(i) for i in range(width)],
+                                        use_threads=True),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={str(i): pa.string() for i in range(width)},
+            include_columns=[str(i) for i in EXCEL_USED_COLUMNS if i < width],
+            null_values=[''],
+            strings_can_be_null=True
+        )
+    )
+    if table.num_rows == 0:
+        raise ValueError("CSV file has insufficient data")
+    
+    data = table.to_pandas()
+    data.columns = [int(name) for name in data.columns]
+    
+    # Text exports carry dates as ISO text; render those like workbook date cells
+    for idx in EXCEL_DATE_COLUMNS.values():
+        if idx in data.columns:
+            parsed = pd.to_datetime(data[idx], format='ISO8601', errors='coerce')
+            data[idx] = parsed.dt.strftime(EXCEL_DATE_FORMAT).where(parsed.notna(), data[idx])
+    return normalize_client_columns(data)
+
+def parse_columnar_source(source: UploadSource, file_format: str) -> pd.DataFrame:
+    """Load a Parquet or Arrow IPC file directly.
+
+    Files that carry the ExcelData field names are taken by name; anything
+    else is read by column position like the workbook, minus the banner rows
+    that only spreadsheet exports have. Only the used columns are read.
+    """
+    stream = _arrow_source(source)
+    if file_format == 'parquet':
+        parquet_file = pq.ParquetFile(stream)
+        names = parquet_file.schema_arrow.names
+    else:
+        reader = _open_arrow_ipc(stream)
+        names = reader.schema.names
+    
+    named = set(EXCEL_TEXT_COLUMNS) <= set(names)
+    if named:
+        wanted = [name for name in CLIENT_FIELDS if name in names]
+    else:
+        wanted = [names[idx] for idx in EXCEL_USED_COLUMNS if idx < len(names)]
+    
+    if file_format == 'parquet':
+        table = parquet_file.read(columns=wanted, use_threads=True)
+    else:
+        table = reader.read_all().select(wanted)
+    if table.num_rows == 0:
+        raise ValueError(f"{file_format.capitalize()} file has insufficient data")
+    
+    data = table.to_pandas()
+    if not named:
+        data.columns = [names.index(name) for name in wanted]
+    return normalize_client_columns(data, named=named)
+
+def _open_arrow_ipc(stream):
+    try:
+        return pa.ipc.open_file(stream)
+    except pa.ArrowInvalid:
+        stream.seek(0)
+        return pa.ipc.open_stream(stream)
+
+# Accepted upload formats by file extension; magic bytes win when they disagree
+UPLOAD_FORMATS = {
+    '.xlsx': 'excel', '.xls': 'excel', '.csv': 'csv', '.parquet': 'parquet',
+    '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow'
+}
+UPLOAD_MAGIC = [(b'PK\x03\x04', 'excel'), (b'PAR1', 'parquet'), (b'ARROW1', 'arrow'), (b'\xff\xff\xff\xff', 'arrow')]
+
+def detect_upload_format(file_name: str, head: bytes = b'') -> Optional[str]:
+    """Return the upload format for a file name (and optionally its first bytes)"""
+    file_format = UPLOAD_FORMATS.get(Path(file_name or '').suffix.lower())
+    if file_format is None:
+        return None
+    for magic, magic_format in UPLOAD_MAGIC:
+        if head.startswith(magic):
+            return magic_format
+    return file_format
+
+def parse_upload_source(source: UploadSource, file_name: str) -> pd.DataFrame:
+    """Parse an uploaded export in any supported format into normalized client columns.
+
+    Only raises plain exceptions, so it can run inside a parse worker process.
+    """
+    file_format = detect_upload_format(file_name, _source_head(source, 8))
+    if file_format == 'csv':
+        return parse_csv_source(source)
+    if file_format in ('parquet', 'arrow'):
+        return parse_columnar_source(source, file_format)
+    return parse_excel_source(source)
+
+# Parse worker pool; PARSE_WORKERS=0 falls back to the event loop's thread pool
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', str(min(4, os.cpu_count() or 1))))
+PARSE_START_METHOD = os.environ.get('PARSE_START_METHOD', 'spawn')
+_parse_executor: Optional[ProcessPoolExecutor] = None
+
+def get_parse_executor() -> Optional[ProcessPoolExecutor]:
+    global _parse_executor
+    if _parse_executor is None and PARSE_WORKERS > 0:
+        _parse_executor = ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS,
+            mp_context=multiprocessing.get_context(PARSE_START_METHOD)
+        )
+    return _parse_executor
+
+def discard_parse_executor(broken: ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker died so the next parse starts a fresh one"""
+    global _parse_executor
+    if _parse_executor is broken:
+        _parse_executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+# Parsed workbooks are cached by content hash: an in-memory LRU in front of
+# zstd-compressed Parquet files on local disk
+PARSE_CACHE_DIR = Path(os.environ.get('PARSE_CACHE_DIR', ROOT_DIR / 'parse_cache'))
+PARSE_CACHE_MEMORY_MB = int(os.environ.get('PARSE_CACHE_MEMORY_MB', '512'))
+PARSE_CACHE_DISK_MB = int(os.environ.get('PARSE_CACHE_DISK_MB', '4096'))
+PARSE_CACHE_VERSION = '1'  # bump whenever the normalized column layout changes
+
+class ParseCache:
+    """Content-addressed cache of normalized client frames"""
+    
+    def __init__(self, directory: Path, memory_bytes: int, disk_bytes: int):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._entries: "OrderedDict[str, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._used = 0
+        self._lock = threading.Lock()
+    
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}-v{PARSE_CACHE_VERSION}.parquet"
+    
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
         
-        data = df.iloc[2:].reset_index(drop=True)  # Skip first 2 rows
+        path = self._path(key)
+        try:
+            frame = pd.read_parquet(path)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable parse cache entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        self._remember(key, frame)
+        return frame
+    
+    def put(self, key: str, frame: pd.DataFrame) -> None:
+        self._remember(key, frame)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            frame.to_parquet(tmp_path, compression='zstd', index=False)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+        except Exception as e:
+            logger.warning(f"Could not write parse cache entry {key}: {e}")
+    
+    def _remember(self, key: str, frame: pd.DataFrame) -> None:
+        size = int(frame.memory_usage(deep=True).sum())
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._used -= self._entries.pop(key)[1]
+            self._entries[key] = (frame, size)
+            self._used += size
+            while self._used > self.memory_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._used -= evicted_size
+    
+    def _evict_disk(self) -> None:
+        files = sorted(self.directory.glob('*.parquet'), key=lambda f: f.stat().st_mtime)
+        total = sum(f.stat().st_size for f in files)
+        for f in files:
+            if total <= self.disk_bytes:
+                break
+            total -= f.stat().st_size
+            f.unlink(missing_ok=True)
+
+parse_cache = ParseCache(PARSE_CACHE_DIR, PARSE_CACHE_MEMORY_MB * 1024 * 1024, PARSE_CACHE_DISK_MB * 1024 * 1024)
+
+# Uploads are streamed to spool files that parse workers read by path
+UPLOAD_SPOOL_DIR = os.environ.get('UPLOAD_SPOOL_DIR') or tempfile.gettempdir()
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_MB', '200')) * 1024 * 1024
+UPLOAD_PATHS = {'/api/upload-excel', '/api/upload-jobs'}
+
+class SpooledUpload(NamedTuple):
+    path: str
+    file_name: str
+    sha256: str
+    size: int
+
+UPLOAD_FIELDS = ('current_month_file', 'last_month_file')
+# The upload routes read their body themselves, so the form is documented by hand
+UPLOAD_REQUEST_BODY = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": list(UPLOAD_FIELDS),
+    "properties": {name: {"type": "string", "format": "binary"} for name in UPLOAD_FIELDS}
+}}}}}
+
+async def spool_multipart(request: Request, fields: Tuple[str, ...] = UPLOAD_FIELDS,
+                          max_bytes: int = MAX_UPLOAD_BYTES) -> List[SpooledUpload]:
+    """Stream the named file parts of a multipart body straight to spool files.
+
+    Each part is hashed and size-checked as it arrives and written to disk
+    once, so nothing is buffered in memory or in a second temporary file.
+    Returns one upload per field, in the order of fields.
+    """
+    content_type, options = parse_options_header(request.headers.get('content-type', ''))
+    if content_type != b'multipart/form-data' or b'boundary' not in options:
+        raise HTTPException(status_code=422, detail=f"Expected a multipart upload with {' and '.join(fields)}")
+    
+    parts: Dict[str, Dict[str, Any]] = {}
+    writes: List[Tuple[Any, bytes]] = []
+    headers: Dict[bytes, bytes] = {}
+    header_field = b''
+    part: Optional[Dict[str, Any]] = None
+    
+    def on_part_begin():
+        nonlocal part, headers
+        part, headers = None, {}
+    
+    def on_header_field(data: bytes, start: int, end: int):
+        nonlocal header_field
+        header_field += data[start:end]
+    
+    def on_header_value(data: bytes, start: int, end: int):
+        name = header_field.lower()
+        headers[name] = headers.get(name, b'') + data[start:end]
+    
+    def on_header_end():
+        nonlocal header_field
+        header_field = b''
+    
+    def on_headers_finished():
+        nonlocal part
+        _, disposition = parse_options_header(headers.get(b'content-disposition', b''))
+        name = disposition.get(b'name', b'').decode('utf-8', errors='replace')
+        if name not in fields or b'filename' not in disposition:
+            return
+        if name in parts:
+            raise HTTPException(status_code=422, detail=f"{name} was sent more than once")
+        part = parts[name] = {
+            "file_name": disposition[b'filename'].decode('utf-8', errors='replace'),
+            "spool": tempfile.NamedTemporaryFile(dir=UPLOAD_SPOOL_DIR, prefix='upload-', delete=False),
+            "digest": hashlib.sha256(),
+            "size": 0
+        }
+    
+    def on_part_data(data: bytes, start: int, end: int):
+        if part is None:
+            return
+        chunk = data[start:end]
+        part["size"] += len(chunk)
+        if part["size"] > max_bytes:
+            raise HTTPException(status_code=413, detail=f"{part['file_name']} exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+        part["digest"].update(chunk)
+        writes.append((part["spool"], chunk))
+    
+    def write_pending():
+        for spool, chunk in writes:
+            spool.write(chunk)
+    
+    parser = MultipartParser(options[b'boundary'], {
+        'on_part_begin': on_part_begin, 'on_header_field': on_header_field, 'on_header_value': on_header_value,
+        'on_header_end': on_header_end, 'on_headers_finished': on_headers_finished, 'on_part_data': on_part_data
+    })
+    try:
+        async for body in request.stream():
+            parser.write(body)
+            if writes:
+                await asyncio.to_thread(write_pending)
+                writes.clear()
+        parser.finalize()
+        for entry in parts.values():
+            entry["spool"].close()
+        missing = [name for name in fields if name not in parts]
+        if missing:
+            raise HTTPException(status_code=422, detail=f"Missing upload: {', '.join(missing)}")
+    except BaseException:
+        for entry in parts.values():
+            entry["spool"].close()
+            os.unlink(entry["spool"].name)
+        raise
+    return [SpooledUpload(parts[name]["spool"].name, parts[name]["file_name"], parts[name]["digest"].hexdigest(),
+                          parts[name]["size"]) for name in fields]
+
+def discard_spooled(*uploads: SpooledUpload) -> None:
+    for upload in uploads:
+        try:
+            os.unlink(upload.path)
+        except FileNotFoundError:
+            pass
+
+class UploadSizeLimitMiddleware:
+    """Reject upload requests over the size limit while the body is still arriving.
+
+    A request may carry `files` uploads of up to max_file_bytes each, plus a
+    chunk of slack for the multipart framing. Any body over that total holds
+    at least one file over the per-file limit, which is what the 413 reports.
+    """
+    
+    def __init__(self, app, max_file_bytes: int, files: int, paths: set):
+        self.app = app
+        self.max_file_bytes = max_file_bytes
+        self.max_bytes = files * max_file_bytes + UPLOAD_CHUNK_BYTES
+        self.paths = paths
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.paths:
+            return await self.app(scope, receive, send)
         
-        processed_data = []
-        for index, row in data.iterrows():
-            try:
-                # Safe value extraction with defaults
-                def safe_get(series, idx, default=''):
-                    return series.iloc[idx] if idx < len(series) and pd.notna(series.iloc[idx]) else default
-                
-                def safe_float(value):
-                    try:
-                        return float(value) if pd.notna(value) else 0.0
-                    except:
-                        return 0.0
-                
-                def format_date(date_val):
-                    if pd.isna(date_val):
-                        return ''
-                    if isinstance(date_val, datetime):
-                        return date_val.strftime('%d-%b-%y')
-                    return str(date_val)
-                
-                item = ExcelData(
-                    srNo=index + 1,
-                    memberId=str(safe_get(row, 1, '')),
-                    name=str(safe_get(row, 2, '')),
-                    branch=str(safe_get(row, 4, 'Unknown')),
-                    co=str(safe_get(row, 5, 'Unknown')),
-                    dueTotal=safe_float(safe_get(row, 10)),
-                    currentRecTotal=safe_float(safe_get(row, 14)),
-                    totalOverdue=safe_float(safe_get(row, 21)),
-                    currentAdvance=safe_float(safe_get(row, 18)),
-                    openingAdvance=safe_float(safe_get(row, 17)),
-                    disbDate=format_date(safe_get(row, 23)),
-                    lastInstallDate=format_date(safe_get(row, 26)),
-                    olp=safe_float(safe_get(row, 27)),
-                    cellNo=str(safe_get(row, 31, ''))
-                )
-                
-                # Filter out items with Unknown branch/co
-                if item.branch != 'Unknown' and item.co != 'Unknown':
-                    processed_data.append(item)
-                    
-            except Exception as e:
-                logger.warning(f"Error processing row {index}: {e}")
-                continue
+        detail = f"Upload exceeds the {self.max_file_bytes // (1024 * 1024)} MB per-file limit"
+        declared = dict(scope['headers']).get(b'content-length')
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
         
-        return processed_data
+        received = 0
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
         
-    except Exception as e:
-        logger.error(f"Error processing Excel file {file_name}: {e}")
-        raise HTTPException(status_code=400, detail=f"Error processing Excel file: {str(e)}")
+        await self.app(scope, limited_receive, send)
 
-def calculate_metrics(current_data: List[ExcelData], last_month_data: List[ExcelData], 
-                     view_type: str = 'Branch', yesterday_date: str = '', today_date: str = '') -> Dict[str, DashboardMetrics]:
-    """Calculate metrics similar to the HTML dashboard logic"""
+async def process_excel_files(*uploads: SpooledUpload,
+                              on_parsed: Optional[Callable[[SpooledUpload, int], Awaitable[None]]] = None) -> List[pd.DataFrame]:
+    """Parse several spooled uploads concurrently off the event loop.
+
+    Uploads already in the parse cache are not parsed again. Workers receive
+    only the spool path and hand back the normalized frame, which pickles as a
+    handful of contiguous column blocks rather than one object per client.
+    on_parsed is awaited with each upload and its row count as it completes.
+    """
+    loop = asyncio.get_running_loop()
+    cached = await asyncio.gather(*[asyncio.to_thread(parse_cache.get, upload.sha256) for upload in uploads])
+    
+    async def parse(upload: SpooledUpload) -> pd.DataFrame:
+        # A worker killed mid-parse (OOM, crash) breaks the whole pool: replace it and retry once
+        for attempt in range(2):
+            executor = get_parse_executor()
+            try:
+                frame = await loop.run_in_executor(executor, parse_upload_source, upload.path, upload.file_name)
+                break
+            except BrokenProcessPool:
+                discard_parse_executor(executor)
+                logger.error(f"Parse worker died while parsing {upload.file_name} (attempt {attempt + 1})")
+        else:
+            raise HTTPException(status_code=503, detail=f"The parse worker crashed twice on {upload.file_name}; "
+                                                        "the file may be too large to parse")
+        if on_parsed is not None:
+            await on_parsed(upload, len(frame))
+        return frame
     
+    misses = [i for i, frame in enumerate(cached) if frame is None]
+    results = await asyncio.gather(*[parse(uploads[i]) for i in misses], return_exceptions=True)
+    parsed = dict(zip(misses, results))
+    
+    frames = []
+    for i, (upload, frame) in enumerate(zip(uploads, cached)):
+        file_name, key = upload.file_name, upload.sha256
+        if frame is not None:
+            logger.info(f"Parse cache hit for {file_name}")
+            if on_parsed is not None:
+                await on_parsed(upload, len(frame))
+            frames.append(frame)
+            continue
+        result = parsed[i]
+        if isinstance(result, HTTPException):
+            raise result
+        if isinstance(result, Exception):
+            logger.error(f"Error processing Excel file {file_name}: {result}")
+            raise HTTPException(status_code=400, detail=f"Error processing Excel file: {str(result)}")
+        await asyncio.to_thread(parse_cache.put, key, result)
+        frames.append(result)
+    return frames
+
+# Each rule's conditions are ANDed (column, operator, operand) triples; the operands
+# 'yesterday' and 'today' stand for the upload's date filters. Both the pandas engine
+# and the Mongo pipeline are generated from these, so they cannot drift apart
+METRIC_RULES = [
+    # (metric prefix, source column, conditions)
+    ('currentDue', 'dueTotal', [('dueTotal', '>', 2)]),
+    ('currentRecovered', 'currentRecTotal', [('currentRecTotal', '>', 2)]),
+    ('remainingDue', 'totalOverdue', [('totalOverdue', '>', 5)]),
+    ('yesterdayRecovered', 'currentRecTotal',
+     [('currentRecTotal', '>', 2), ('lastInstallDate', '==', 'yesterday'), ('currentAdvance', '<=', 2)]),
+    ('todayRecovered', 'currentRecTotal',
+     [('lastInstallDate', '==', 'today'), ('currentAdvance', '<=', 1), ('currentRecTotal', '>', 2)]),
+    ('currentAdvance', 'currentAdvance', [('currentAdvance', '>', 2)]),
+    ('openingAdvance', 'openingAdvance', [('openingAdvance', '>', 2)]),
+]
+
+RULE_OPERATORS = {'>': (operator.gt, '$gt'), '<=': (operator.le, '$lte'), '==': (operator.eq, '$eq')}
+
+def rule_operand(operand: Any, yesterday_date: str, today_date: str) -> Any:
+    return {'yesterday': yesterday_date, 'today': today_date}.get(operand, operand) if isinstance(operand, str) else operand
+
+def rule_mask(frame: pd.DataFrame, conditions: List[Tuple], yesterday_date: str, today_date: str) -> np.ndarray:
+    mask = np.ones(len(frame), dtype=bool)
+    for column, op, operand in conditions:
+        mask &= RULE_OPERATORS[op][0](frame[column].to_numpy(), rule_operand(operand, yesterday_date, today_date))
+    return mask
+
+def rule_expression(conditions: List[Tuple], yesterday_date: str, today_date: str) -> Dict[str, Any]:
+    """The same conditions as a Mongo aggregation expression"""
+    return {"$and": [
+        {RULE_OPERATORS[op][1]: [f"${column}", rule_operand(operand, yesterday_date, today_date)]}
+        for column, op, operand in conditions
+    ]}
+
+# Dashboard views and the client column each one groups by; adding a view
+# costs one more reduction over the shared contribution matrix
+GROUP_VIEWS = {'Branch': 'branch', 'CO': 'co'}
+
+def resolve_view(view: str) -> str:
+    """The GROUP_VIEWS name for a view query parameter, matched case-insensitively"""
+    views_by_name = {name.lower(): name for name in GROUP_VIEWS}
+    if view.lower() not in views_by_name:
+        raise HTTPException(status_code=400, detail=f"Unknown view '{view}', expected one of {', '.join(GROUP_VIEWS)}")
+    return views_by_name[view.lower()]
+
+CONTRIBUTION_FIELDS = ['activeCount', 'olpAmount'] + [
+    f'{prefix}{suffix}' for prefix, _, _ in METRIC_RULES for suffix in ('Clients', 'Amount')
+]
+
+def build_contributions(current_data: pd.DataFrame, yesterday_date: str = '', today_date: str = '') -> np.ndarray:
+    """Evaluate every metric rule once, returning one row per CONTRIBUTION_FIELDS entry.
+
+    Column i holds what client i adds to each count and amount of its group.
+    """
+    contributions = np.empty((len(CONTRIBUTION_FIELDS), len(current_data)), dtype=np.float64)
+    contributions[0] = 1.0
+    contributions[1] = current_data['olp'].to_numpy()
+    for i, (prefix, source, conditions) in enumerate(METRIC_RULES):
+        mask = rule_mask(current_data, conditions, yesterday_date, today_date)
+        contributions[2 + 2 * i] = mask
+        contributions[3 + 2 * i] = np.where(mask, current_data[source].to_numpy(), 0.0)
+    return contributions
+
+def reduce_by_group(codes: np.ndarray, group_count: int, values: np.ndarray) -> np.ndarray:
+    """Sum each row of values per group code (vectorized group-by)"""
+    return np.vstack([np.bincount(codes, weights=row, minlength=group_count) for row in values])
+
+def build_dashboard_metrics(keys, sums: np.ndarray, last_month_till: np.ndarray) -> Dict[str, DashboardMetrics]:
+    """Turn reduced per-group sums into DashboardMetrics keyed by group"""
     metrics = {}
+    for i, key in enumerate(keys):
+        row = dict(zip(CONTRIBUTION_FIELDS, sums[:, i].tolist()))
+        due_amount = row['currentDueAmount']
+        recovered_amount = row['currentRecoveredAmount']
+        metrics[key] = DashboardMetrics.model_construct(
+            key=key,
+            lastMonthTillClients=int(last_month_till[0, i]),
+            lastMonthTillAmount=float(last_month_till[1, i]),
+            recoveryPercentage=round((recovered_amount / due_amount) * 100, 2) if due_amount > 0 else 0,
+            **{name: (int(value) if name.endswith(('Clients', 'Count')) else value)
+               for name, value in row.items()}
+        )
+    return metrics
+
+class RecoveryHistogram:
+    """Per-group recovery counts and amounts by lastInstallDate, as prefix sums.
+
+    Days are integer ordinals (days since the epoch). Only days that occur in
+    the data get a column, so a stray far-off date doesn't blow up the table.
+    A window [from, to] is answered with two lookups per group.
+    """
+    
+    def __init__(self, keys: pd.Index, days: np.ndarray, counts: np.ndarray, amounts: np.ndarray):
+        self.keys = keys
+        self.days = days
+        self.counts = counts
+        self.amounts = amounts
+        zero = np.zeros((len(keys), 1))
+        self.cumulative_counts = np.hstack([zero, counts.cumsum(axis=1)])
+        self.cumulative_amounts = np.hstack([zero, amounts.cumsum(axis=1)])
+    
+    @classmethod
+    def build(cls, current_data: pd.DataFrame, keys: pd.Index, column: str) -> 'RecoveryHistogram':
+        # Same rule as the "yesterday recovered" card, over any day
+        recovered = ((current_data['currentRecTotal'] > 2) & (current_data['currentAdvance'] <= 2)).to_numpy()
+        dates = pd.to_datetime(current_data['lastInstallDate'], format=EXCEL_DATE_FORMAT, errors='coerce')
+        ordinals = dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+        counted = recovered & dates.notna().to_numpy()
+        
+        days, day_index = np.unique(ordinals[counted], return_inverse=True)
+        flat = keys.get_indexer(current_data[column].to_numpy()[counted]) * len(days) + day_index
+        shape = (len(keys), len(days))
+        counts = np.bincount(flat, minlength=shape[0] * shape[1]).reshape(shape)
+        amounts = np.bincount(flat, weights=current_data['currentRecTotal'].to_numpy()[counted],
+                              minlength=shape[0] * shape[1]).reshape(shape)
+        return cls(keys, days, counts, amounts)
+    
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> 'RecoveryHistogram':
+        """Rebuild a histogram from its stored rows (see rows), in group order"""
+        days = np.unique(np.concatenate([np.asarray(row["days"], dtype=np.int64) for row in rows]))
+        counts = np.zeros((len(rows), len(days)), dtype=np.int64)
+        amounts = np.zeros((len(rows), len(days)))
+        for i, row in enumerate(rows):
+            columns = np.searchsorted(days, row["days"])
+            counts[i, columns] = row["counts"]
+            amounts[i, columns] = row["amounts"]
+        return cls(pd.Index([row["key"] for row in rows]), days, counts, amounts)
+    
+    def rows(self) -> List[Dict[str, Any]]:
+        """One row per group with the days it recovered anything on"""
+        rows = []
+        for i, key in enumerate(self.keys):
+            present = np.flatnonzero(self.counts[i])
+            rows.append({"key": key, "days": self.days[present].tolist(),
+                         "counts": self.counts[i, present].tolist(), "amounts": self.amounts[i, present].tolist()})
+        return rows
+    
+    def window(self, first_day: int, last_day: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Recovered clients and amounts per group for days first_day..last_day inclusive"""
+        lo = np.searchsorted(self.days, first_day, side='left')
+        hi = np.searchsorted(self.days, last_day, side='right')
+        if hi <= lo:
+            return np.zeros(len(self.keys), dtype=np.int64), np.zeros(len(self.keys))
+        counts = self.cumulative_counts[:, hi] - self.cumulative_counts[:, lo]
+        amounts = self.cumulative_amounts[:, hi] - self.cumulative_amounts[:, lo]
+        return counts.astype(np.int64), amounts
+
+def parse_day_ordinal(value: str) -> int:
+    """Parse a dashboard date ('17-Jan-24') or ISO date into a day ordinal"""
+    for date_format in (EXCEL_DATE_FORMAT, '%Y-%m-%d'):
+        try:
+            return (datetime.strptime(value, date_format).date() - date(1970, 1, 1)).days
+        except ValueError:
+            continue
+    raise HTTPException(status_code=400, detail=f"Invalid date '{value}', expected DD-Mon-YY or YYYY-MM-DD")
+
+# Columns compared month over month, and the delta field each one feeds
+DELTA_COLUMNS = {'dueDelta': 'dueTotal', 'recoveredDelta': 'currentRecTotal',
+                 'overdueDelta': 'totalOverdue', 'advanceDelta': 'currentAdvance'}
+CLIENT_DELTA_STATUSES = ('new', 'improved', 'slipped', 'unchanged')
+
+class MonthOverMonthJoin:
+    """Current-month clients joined to their last-month row by memberId.
+
+    The last-month memberId index is hashed once per snapshot; every delta
+    and status is then computed column-wise over the joined positions.
+    Clients without a last-month row are 'new' and carry their full values
+    as deltas; last-month clients missing this month are counted as lost.
+    """
+    
+    def __init__(self, current_data: pd.DataFrame, last_month_data: pd.DataFrame):
+        self.current_data = current_data
+        self.last_month_data = last_month_data
+        
+        # A memberId repeated last month joins to its first row
+        last_index = pd.Index(last_month_data['memberId'])
+        first_rows = np.flatnonzero(~last_index.duplicated(keep='first'))
+        joined = last_index[first_rows].get_indexer(current_data['memberId'])
+        matched = joined >= 0
+        self.last_positions = np.where(matched, first_rows[np.maximum(joined, 0)], -1)
+        gather = np.maximum(self.last_positions, 0)
+        
+        self.deltas = {}
+        for field, column in DELTA_COLUMNS.items():
+            previous = np.where(matched, last_month_data[column].to_numpy()[gather], 0.0)
+            self.deltas[field] = current_data[column].to_numpy() - previous
+        
+        was_overdue = matched & (last_month_data['totalOverdue'].to_numpy()[gather] > 5)
+        is_overdue = current_data['totalOverdue'].to_numpy() > 5
+        self.flags = {
+            'matchedClients': matched,
+            'newClients': ~matched,
+            'improvedClients': matched & (self.deltas['overdueDelta'] < 0),
+            'slippedClients': matched & (self.deltas['overdueDelta'] > 0),
+            'curedClients': matched & was_overdue & ~is_overdue,
+            'rolledClients': matched & ~was_overdue & is_overdue,
+        }
+        self.status = np.select(
+            [~matched, self.flags['improvedClients'], self.flags['slippedClients']],
+            ['new', 'improved', 'slipped'], default='unchanged'
+        )
+        
+        # Lost clients are counted once per memberId, on the row the join would use
+        lost = np.zeros(len(last_month_data), dtype=bool)
+        lost[first_rows] = True
+        lost[self.last_positions[matched]] = False
+        self.lost_rows = last_month_data[lost]
     
-    # Build last month due data map for reference
-    last_month_due_data = {}
-    for item in last_month_data:
-        key = item.branch if view_type == 'Branch' else item.co
-        if key not in last_month_due_data:
-            last_month_due_data[key] = 0
-        if item.dueTotal > 2:
-            last_month_due_data[key] += item.dueTotal
-    
-    # Process current month data
-    for item in current_data:
-        key = item.branch if view_type == 'Branch' else item.co
+    def group_deltas(self, view: str, keys: pd.Index) -> List[GroupDelta]:
+        """Reduce the per-client deltas and flags into one GroupDelta per group"""
+        column = GROUP_VIEWS[view]
+        codes = keys.get_indexer(self.current_data[column])
+        flag_sums = reduce_by_group(codes, len(keys), np.vstack(list(self.flags.values())).astype(np.float64))
+        delta_sums = reduce_by_group(codes, len(keys), np.vstack(list(self.deltas.values())))
         
-        if key not in metrics:
-            metrics[key] = DashboardMetrics(
+        lost_codes = keys.get_indexer(self.lost_rows[column])
+        lost_counts = np.bincount(lost_codes[lost_codes >= 0], minlength=len(keys))
+        
+        return [
+            GroupDelta(
                 key=key,
-                activeCount=0,
-                currentDueClients=0,
-                currentDueAmount=0,
-                currentRecoveredClients=0,
-                currentRecoveredAmount=0,
-                lastMonthTillClients=0,
-                lastMonthTillAmount=0,
-                remainingDueClients=0,
-                remainingDueAmount=0,
-                yesterdayRecoveredClients=0,
-                yesterdayRecoveredAmount=0,
-                todayRecoveredClients=0,
-                todayRecoveredAmount=0,
-                currentAdvanceClients=0,
-                currentAdvanceAmount=0,
-                openingAdvanceClients=0,
-                openingAdvanceAmount=0,
-                olpAmount=0,
-                recoveryPercentage=0,
-                clients=[]
+                lostClients=int(lost_counts[i]),
+                **{name: int(flag_sums[j, i]) for j, name in enumerate(self.flags)},
+                **{name: float(delta_sums[j, i]) for j, name in enumerate(self.deltas)}
             )
+            for i, key in enumerate(keys)
+        ]
+    
+    def client_deltas(self, positions: np.ndarray) -> List[ClientDelta]:
+        rows = self.current_data.iloc[positions]
+        return [
+            ClientDelta(memberId=member_id, name=name, branch=branch, co=co, status=status,
+                        dueDelta=due, recoveredDelta=recovered, overdueDelta=overdue, advanceDelta=advance)
+            for member_id, name, branch, co, status, due, recovered, overdue, advance in zip(
+                rows['memberId'], rows['name'], rows['branch'], rows['co'], self.status[positions],
+                *[self.deltas[field][positions].tolist() for field in DELTA_COLUMNS]
+            )
+        ]
+
+# Incremental updates fall back to a full rebuild past this share of changed rows
+INCREMENTAL_MAX_CHANGE_RATIO = float(os.environ.get('INCREMENTAL_MAX_CHANGE_RATIO', '0.5'))
+
+# Only the fields the aggregates read are compared to find changed rows
+INCREMENTAL_COMPARED_FIELDS = [
+    field for field in CLIENT_FIELDS
+    if field == 'olp' or field in GROUP_VIEWS.values()
+    or any(field == source or field in [column for column, _, _ in conditions] for _, source, conditions in METRIC_RULES)
+]
+
+class MetricsSnapshot:
+    """Per-view aggregates of one current-month frame.
+
+    Keeps each client's contribution column and group codes so a later upload
+    of the same month can be applied as a delta keyed by memberId instead of
+    a full pass.
+    """
+    
+    def __init__(self, current_data: pd.DataFrame, last_month_data: pd.DataFrame, contributions: np.ndarray,
+                 keys: Dict[str, pd.Index], codes: Dict[str, np.ndarray], sums: Dict[str, np.ndarray],
+                 last_month_totals: Dict[str, pd.DataFrame], context: Tuple):
+        self.current_data = current_data
+        self.last_month_data = last_month_data
+        self.contributions = contributions
+        self.keys = keys
+        self.codes = codes
+        self.sums = sums
+        self.last_month_totals = last_month_totals
+        self.context = context
+        self.snapshot_id: Optional[str] = None
+        self._recovery_histograms: Dict[str, RecoveryHistogram] = {}
+        self._month_over_month: Optional[MonthOverMonthJoin] = None
+    
+    @classmethod
+    def build(cls, current_data: pd.DataFrame, last_month_data: pd.DataFrame, yesterday_date: str = '',
+              today_date: str = '', last_month_key: str = '') -> 'MetricsSnapshot':
+        contributions = build_contributions(current_data, yesterday_date, today_date)
         
-        # Add to active count and client list
-        metrics[key].activeCount += 1
-        metrics[key].clients.append(item)
-        
-        # Current Due calculation
-        if item.dueTotal > 2:
-            metrics[key].currentDueClients += 1
-            metrics[key].currentDueAmount += item.dueTotal
+        # "Last Month Till" only needs the recovered last-month rows
+        recovered = last_month_data[last_month_data['currentRecTotal'] > 2]
         
-        # Current Recovered calculation  
-        if item.currentRecTotal > 2:
-            metrics[key].currentRecoveredClients += 1
-            metrics[key].currentRecoveredAmount += item.currentRecTotal
+        keys, codes, sums, last_month_totals = {}, {}, {}, {}
+        for view, column in GROUP_VIEWS.items():
+            codes[view], keys[view] = pd.factorize(current_data[column], sort=False)
+            sums[view] = reduce_by_group(codes[view], len(keys[view]), contributions)
+            last_month_totals[view] = recovered.groupby(column, sort=False)['currentRecTotal'].agg(['size', 'sum'])
+        return cls(current_data, last_month_data, contributions, keys, codes, sums, last_month_totals,
+                   (yesterday_date, today_date, last_month_key))
+    
+    def update(self, current_data: pd.DataFrame, yesterday_date: str = '', today_date: str = '',
+               last_month_key: str = '') -> Optional['MetricsSnapshot']:
+        """Apply a new upload of the current month as a delta against this snapshot.
+
+        Rows are matched by memberId where both uploads list the same clients
+        in the same order, with clients added or dropped only at the end. A
+        reordered export would need a hash join over every memberId, which
+        costs more than a rebuild, so it returns None like a change of dates
+        or last month file, or too many changed rows.
+        """
+        old = self.current_data
+        if (yesterday_date, today_date, last_month_key) != self.context or not last_month_key:
+            return None
+        shared = min(len(old), len(current_data))
+        if not np.array_equal(old['memberId'].to_numpy()[:shared], current_data['memberId'].to_numpy()[:shared]):
+            return None
         
-        # Remaining Due calculation
-        if item.totalOverdue > 5:
-            metrics[key].remainingDueClients += 1
-            metrics[key].remainingDueAmount += item.totalOverdue
+        # Compare the shared rows in place; rows past the end of the old upload are new clients
+        changed = np.ones(len(current_data), dtype=bool)
+        changed[:shared] = False
+        for field in INCREMENTAL_COMPARED_FIELDS:
+            changed[:shared] |= current_data[field].to_numpy()[:shared] != old[field].to_numpy()[:shared]
+        incoming = np.flatnonzero(changed)
+        outgoing = np.concatenate([incoming[incoming < shared], np.arange(shared, len(old))])
+        if len(incoming) + len(outgoing) > INCREMENTAL_MAX_CHANGE_RATIO * max(len(current_data), 1):
+            return None
         
-        # Yesterday/Today recovered (simplified date matching)
-        if item.currentRecTotal > 2 and item.lastInstallDate == yesterday_date and item.currentAdvance <= 2:
-            metrics[key].yesterdayRecoveredClients += 1
-            metrics[key].yesterdayRecoveredAmount += item.currentRecTotal
+        incoming_contributions = build_contributions(current_data.iloc[incoming], yesterday_date, today_date)
+        outgoing_contributions = self.contributions[:, outgoing]
+        contributions = np.empty((len(CONTRIBUTION_FIELDS), len(current_data)), dtype=np.float64)
+        contributions[:, :shared] = self.contributions[:, :shared]
+        contributions[:, incoming] = incoming_contributions
         
-        if item.lastInstallDate == today_date and item.currentAdvance <= 1 and item.currentRecTotal > 2:
-            metrics[key].todayRecoveredClients += 1
-            metrics[key].todayRecoveredAmount += item.currentRecTotal
+        keys, codes, sums = {}, {}, {}
+        rows = np.arange(len(current_data))
+        for view, column in GROUP_VIEWS.items():
+            old_keys = self.keys[view]
+            incoming_keys = current_data[column].to_numpy()[incoming]
+            union = old_keys.append(pd.Index(pd.unique(incoming_keys)).difference(old_keys, sort=False))
+            union_codes = np.empty(len(current_data), dtype=np.intp)
+            union_codes[:shared] = self.codes[view][:shared]
+            union_codes[incoming] = union.get_indexer(incoming_keys)
+            
+            delta = np.zeros((len(CONTRIBUTION_FIELDS), len(union)))
+            delta[:, :len(old_keys)] = self.sums[view]
+            delta -= reduce_by_group(self.codes[view][outgoing], len(union), outgoing_contributions)
+            delta += reduce_by_group(union_codes[incoming], len(union), incoming_contributions)
+            
+            # Same group order as a full rebuild: first appearance in the new frame
+            first_row = np.full(len(union), len(current_data))
+            np.minimum.at(first_row, union_codes, rows)
+            order = np.argsort(first_row)[:np.count_nonzero(first_row < len(current_data))]
+            remap = np.empty(len(union), dtype=np.intp)
+            remap[order] = np.arange(len(order))
+            keys[view], codes[view] = union[order], remap[union_codes]
+            sums[view] = delta[:, order]
+            counts = [i for i, name in enumerate(CONTRIBUTION_FIELDS) if not name.endswith('Amount')]
+            sums[view][counts] = np.rint(sums[view][counts])
         
-        # Current Advance calculation
-        if item.currentAdvance > 2:
-            metrics[key].currentAdvanceClients += 1
-            metrics[key].currentAdvanceAmount += item.currentAdvance
+        logger.info(f"Applied incremental update: {len(incoming)} changed/added, {len(old) - shared} removed")
+        return MetricsSnapshot(current_data, self.last_month_data, contributions, keys, codes, sums,
+                               self.last_month_totals, self.context)
+    
+    def recovery_histogram(self, view: str) -> RecoveryHistogram:
+        """Per-day recovery histogram for a view, built on first use"""
+        if view not in self._recovery_histograms:
+            self._recovery_histograms[view] = RecoveryHistogram.build(
+                self.current_data, self.keys[view], GROUP_VIEWS[view]
+            )
+        return self._recovery_histograms[view]
+    
+    def month_over_month(self) -> MonthOverMonthJoin:
+        """memberId join against last month, built on first use"""
+        if self._month_over_month is None:
+            self._month_over_month = MonthOverMonthJoin(self.current_data, self.last_month_data)
+        return self._month_over_month
+    
+    def metrics(self, views: Optional[List[str]] = None) -> Dict[str, Dict[str, DashboardMetrics]]:
+        """Build DashboardMetrics per view from the stored aggregates"""
+        results = {}
+        for view in views or list(GROUP_VIEWS):
+            keys = self.keys[view]
+            last_month_till = self.last_month_totals[view].reindex(keys, fill_value=0).to_numpy().T
+            results[view] = build_dashboard_metrics(keys, self.sums[view], last_month_till)
+        return results
+
+# Latest snapshot of this worker, the base for incremental updates
+_metrics_snapshot: Optional[MetricsSnapshot] = None
+
+def update_metrics_snapshot(current_data: pd.DataFrame, last_month_data: pd.DataFrame, yesterday_date: str = '',
+                            today_date: str = '', last_month_key: str = '', incremental: bool = True) -> MetricsSnapshot:
+    """Update the stored snapshot from a new upload, incrementally when possible"""
+    global _metrics_snapshot
+    snapshot = None
+    if incremental and _metrics_snapshot is not None:
+        snapshot = _metrics_snapshot.update(current_data, yesterday_date, today_date, last_month_key)
+    if snapshot is None:
+        snapshot = MetricsSnapshot.build(current_data, last_month_data, yesterday_date, today_date, last_month_key)
+    _metrics_snapshot = snapshot
+    return snapshot
+
+def compute_group_metrics(current_data: pd.DataFrame, last_month_data: pd.DataFrame,
+                          yesterday_date: str = '', today_date: str = '',
+                          views: Optional[List[str]] = None) -> Dict[str, Dict[str, DashboardMetrics]]:
+    """Calculate metrics for several views in a single pass over the client rows"""
+    snapshot = MetricsSnapshot.build(current_data, last_month_data, yesterday_date, today_date)
+    return snapshot.metrics(views)
+
+def calculate_metrics(current_data: pd.DataFrame, last_month_data: pd.DataFrame,
+                     view_type: str = 'Branch', yesterday_date: str = '', today_date: str = '') -> Dict[str, DashboardMetrics]:
+    """Calculate metrics similar to the HTML dashboard logic"""
+    return compute_group_metrics(current_data, last_month_data, yesterday_date, today_date, [view_type])[view_type]
+
+# Client rows are served page by page from a per-snapshot table with precomputed sort orders
+CLIENT_SORT_FIELDS = ['srNo', 'memberId', 'name', 'co', 'branch', 'dueTotal', 'currentRecTotal',
+                      'totalOverdue', 'currentAdvance', 'openingAdvance', 'olp']
+CLIENT_PAGE_LIMIT = 1000
+
+# Overdue rankings are precomputed per snapshot for clients over the remaining-due threshold
+TOP_OVERDUE_MAX_N = int(os.environ.get('TOP_OVERDUE_MAX_N', '200'))
+OVERDUE_PERCENTILES = [50, 75, 90, 95, 99]
+
+class OverdueRanking:
+    """Worst-overdue clients and overdue percentile bands per group of one view.
+
+    One grouped sort (group code, then totalOverdue) gives both: the tail of
+    each group's segment is its top-N, and percentiles are interpolated
+    straight from the sorted segment.
+    """
+    
+    def __init__(self, frame: pd.DataFrame, column: str, max_n: int = TOP_OVERDUE_MAX_N):
+        overdue = frame['totalOverdue'].to_numpy()
+        candidates = np.flatnonzero(overdue > 5)
+        codes, self.keys = pd.factorize(frame[column], sort=False)
+        codes = codes[candidates]
         
-        # Opening Advance calculation
-        if item.openingAdvance > 2:
-            metrics[key].openingAdvanceClients += 1
-            metrics[key].openingAdvanceAmount += item.openingAdvance
+        grouped = np.lexsort((overdue[candidates], codes))
+        order = candidates[grouped]
+        bounds = np.searchsorted(codes[grouped], np.arange(len(self.keys) + 1))
+        self.counts = np.diff(bounds)
+        self.top = [order[max(end - max_n, start):end][::-1] for start, end in zip(bounds[:-1], bounds[1:])]
+        self.percentiles = [
+            {f"p{q}": float(v) for q, v in zip(OVERDUE_PERCENTILES, np.percentile(overdue[order[start:end]], OVERDUE_PERCENTILES))}
+            if end > start else {f"p{q}": 0.0 for q in OVERDUE_PERCENTILES}
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+def select_clients(frame: pd.DataFrame, branch: Optional[str] = None, co: Optional[str] = None,
+                   min_overdue: Optional[float] = None, max_overdue: Optional[float] = None) -> np.ndarray:
+    """Boolean row mask for the client filters shared by /clients and exports"""
+    mask = np.ones(len(frame), dtype=bool)
+    if branch is not None:
+        mask &= (frame['branch'] == branch).to_numpy()
+    if co is not None:
+        mask &= (frame['co'] == co).to_numpy()
+    if min_overdue is not None:
+        mask &= frame['totalOverdue'].to_numpy() >= min_overdue
+    if max_overdue is not None:
+        mask &= frame['totalOverdue'].to_numpy() <= max_overdue
+    return mask
+
+class ClientTable:
+    """Normalized client rows of one snapshot plus a stable sort index per sortable field"""
+    
+    def __init__(self, snapshot_id: str, frame: pd.DataFrame):
+        self.snapshot_id = snapshot_id
+        self.frame = frame
+        self.sort_index = {}
+        for field in CLIENT_SORT_FIELDS:
+            values = frame[field]
+            if values.dtype == object:
+                values = values.str.lower()
+            self.sort_index[field] = np.argsort(values.to_numpy(), kind='stable')
+        self.overdue_rankings = {view: OverdueRanking(frame, column) for view, column in GROUP_VIEWS.items()}
+    
+    def select(self, branch: Optional[str] = None, co: Optional[str] = None,
+               min_overdue: Optional[float] = None, max_overdue: Optional[float] = None) -> np.ndarray:
+        """Boolean row mask for the given filters"""
+        return select_clients(self.frame, branch, co, min_overdue, max_overdue)
+    
+    def page(self, mask: np.ndarray, sort: str, descending: bool, start: int, limit: int) -> Tuple[np.ndarray, Optional[int]]:
+        """Row positions of one page, walking the sort order from rank start.
+
+        Returns the positions and the rank to resume from (None on the last page).
+        """
+        order = self.sort_index[sort]
+        if descending:
+            order = order[::-1]
+        candidates = order[start:]
+        hits = np.flatnonzero(mask[candidates])
+        if len(hits) <= limit:
+            return candidates[hits], None
+        return candidates[hits[:limit]], start + int(hits[limit - 1]) + 1
+
+def encode_client_cursor(snapshot_id: str, sort: str, order: str, rank: int) -> str:
+    return base64.urlsafe_b64encode(f"{snapshot_id}|{sort}|{order}|{rank}".encode()).decode()
+
+def decode_client_cursor(cursor: str, snapshot_id: str, sort: str, order: str) -> int:
+    try:
+        cursor_snapshot, cursor_sort, cursor_order, rank = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        rank = int(rank)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if (cursor_snapshot, cursor_sort, cursor_order) != (snapshot_id, sort, order):
+        raise HTTPException(status_code=400, detail="Cursor belongs to another snapshot or sort order; restart from the first page")
+    return rank
+
+_client_table: Optional[ClientTable] = None
+
+# Latest snapshot pointer, shared between workers through a counter document
+SNAPSHOT_GENERATION_TTL = float(os.environ.get('SNAPSHOT_GENERATION_TTL_SECONDS', '1'))
+
+class SnapshotRef(NamedTuple):
+    snapshot_id: str
+    filter: Dict[str, Any]
+
+class SnapshotGeneration:
+    """Tracks the latest snapshot through a generation counter bumped by every upload.
+
+    Uploads in this worker publish their snapshot straight away; other
+    workers notice within ttl seconds, re-reading only the counter document.
+    Reads in between never touch Mongo.
+    """
+    
+    COUNTER_ID = "dashboard_data"
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.generation: Optional[int] = None
+        self.latest: Optional[SnapshotRef] = None
+        self.checked_at = float('-inf')
+    
+    async def current(self) -> Optional[SnapshotRef]:
+        if time.monotonic() - self.checked_at >= self.ttl:
+            await self.refresh()
+        return self.latest
+    
+    async def refresh(self):
+        checked_at = time.monotonic()
+        counter = await db.snapshot_generations.find_one({"_id": self.COUNTER_ID})
+        if counter is not None:
+            if counter["generation"] != self.generation:
+                self.generation = counter["generation"]
+                self.latest = SnapshotRef(counter["snapshot_id"], {"snapshot_id": counter["snapshot_id"]})
+        else:
+            # Snapshots stored before the counter existed
+            header = await db.dashboard_data.find_one(sort=[("timestamp", -1)], projection={"snapshot_id": 1})
+            if header:
+                self.latest = SnapshotRef(header.get("snapshot_id") or str(header["_id"]), {"_id": header["_id"]})
+        self.checked_at = checked_at
+    
+    async def publish(self, snapshot_id: str):
+        counter = await db.snapshot_generations.find_one_and_update(
+            {"_id": self.COUNTER_ID},
+            {"$inc": {"generation": 1}, "$set": {"snapshot_id": snapshot_id, "timestamp": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self.generation = counter["generation"]
+        self.latest = SnapshotRef(snapshot_id, {"snapshot_id": snapshot_id})
+        self.checked_at = time.monotonic()
+
+snapshot_generation = SnapshotGeneration(SNAPSHOT_GENERATION_TTL)
+
+# Server-sent snapshot events
+SNAPSHOT_EVENTS_POLL_SECONDS = float(os.environ.get('SNAPSHOT_EVENTS_POLL_SECONDS', '2'))
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', '15'))
+
+def sse_frame(event: str, event_id: str, payload: Dict[str, Any]) -> bytes:
+    return b"event: " + event.encode() + b"\nid: " + event_id.encode() + b"\ndata: " + orjson.dumps(payload) + b"\n\n"
+
+class SnapshotEventHub:
+    """Fans new-snapshot events out to every subscriber of this worker.
+
+    Subscribers hold no queue or timer of their own: they all wait on one
+    shared asyncio.Event that is swapped on each broadcast, and the frames
+    are encoded once per snapshot, so an idle subscriber costs one suspended
+    generator. Only the latest snapshot matters, so a subscriber that falls
+    behind simply receives the newest frame. Snapshots stored by other
+    workers are picked up through the generation counter.
+
+    Aggregate frames list the groups changed since baseSnapshotId. A
+    subscriber whose last frame was another snapshot (it connected late, or
+    frames were coalesced while it lagged) gets every group instead.
+    """
+    
+    def __init__(self):
+        self.subscribers = 0
+        self.snapshot_id: Optional[str] = None
+        self.base_snapshot_id: Optional[str] = None
+        self._frames: Dict[str, bytes] = {}
+        self._aggregates: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+    
+    def publish(self, snapshot_id: str, total_metrics: Optional[Dict[str, Any]] = None,
+                metrics_by_view: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        """Announce a snapshot, with the Branch/CO aggregates that changed when known"""
+        compact = sse_frame("snapshot", snapshot_id, {"snapshotId": snapshot_id})
+        full = diff = compact
+        base = self.snapshot_id if self._aggregates else None
+        if metrics_by_view is not None:
+            changed, removed = {}, {}
+            for view, rows in metrics_by_view.items():
+                previous = self._aggregates.get(view, {})
+                current = {row["key"]: row for row in rows}
+                changed[view] = [row for key, row in current.items() if previous.get(key) != row]
+                removed[view] = [key for key in previous if key not in current]
+                self._aggregates[view] = current
+            payload = {"snapshotId": snapshot_id, "totalMetrics": total_metrics}
+            full = sse_frame("snapshot", snapshot_id, {
+                **payload, "baseSnapshotId": None, "changed": metrics_by_view,
+                "removed": {view: [] for view in metrics_by_view}
+            })
+            diff = full if base is None else sse_frame("snapshot", snapshot_id, {
+                **payload, "baseSnapshotId": base, "changed": changed, "removed": removed
+            })
+        else:
+            self._aggregates.clear()
+            base = None
+        self.snapshot_id = snapshot_id
+        self.base_snapshot_id = base
+        self._frames = {"compact": compact, "diff": diff, "full": full}
+        self._broadcast()
+    
+    def _broadcast(self):
+        if self._wakeup is not None:
+            wakeup, self._wakeup = self._wakeup, asyncio.Event()
+            wakeup.set()
+    
+    async def stream(self, aggregates: bool, last_event_id: Optional[str]) -> AsyncIterator[bytes]:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self.subscribers += 1
+        try:
+            yield f"retry: {int(SNAPSHOT_EVENTS_POLL_SECONDS * 1000)}\n\n".encode()
+            sent = last_event_id
+            while True:
+                # Taken before yielding, so a broadcast during the send is not missed
+                wakeup = self._wakeup
+                if self.snapshot_id is not None and self.snapshot_id != sent:
+                    # A diff only applies on top of the snapshot it was taken against
+                    frame = "compact" if not aggregates else "diff" if sent == self.base_snapshot_id else "full"
+                    sent = self.snapshot_id
+                    yield self._frames[frame]
+                await wakeup.wait()
+                if self.snapshot_id == sent:
+                    yield b": keepalive\n\n"
+        finally:
+            self.subscribers -= 1
+    
+    async def run(self):
+        """Single timer for the whole hub: remote snapshot checks and keepalives"""
+        idle = 0.0
+        while True:
+            await asyncio.sleep(SNAPSHOT_EVENTS_POLL_SECONDS)
+            if not self.subscribers:
+                continue
+            try:
+                latest = await snapshot_generation.current()
+                if latest is not None and latest.snapshot_id != self.snapshot_id:
+                    self.publish(latest.snapshot_id)
+                    idle = 0.0
+                    continue
+            except Exception as e:
+                logger.error(f"Snapshot event check failed: {e}")
+            idle += SNAPSHOT_EVENTS_POLL_SECONDS
+            if idle >= SSE_KEEPALIVE_SECONDS:
+                idle = 0.0
+                self._broadcast()
+
+snapshot_events = SnapshotEventHub()
+_snapshot_events_task: Optional[asyncio.Task] = None
+
+async def require_latest_snapshot() -> SnapshotRef:
+    latest = await snapshot_generation.current()
+    if latest is None:
+        raise HTTPException(status_code=404, detail="No dashboard data found. Please upload Excel files first.")
+    return latest
+
+def frame_from_stored_clients(document: Dict[str, Any]) -> pd.DataFrame:
+    """Rebuild the client frame from a dashboard_data document of an earlier layout.
+
+    Those stored the rows once, column-wise, or before that embedded them in
+    every branch metric.
+    """
+    if 'clients' in document:
+        return pd.DataFrame(document['clients'], columns=CLIENT_FIELDS)
+    rows = [client for metric in document.get('branch_metrics', []) for client in metric.get('clients', [])]
+    return pd.DataFrame(rows, columns=CLIENT_FIELDS).sort_values('srNo', kind='stable').reset_index(drop=True)
+
+async def latest_client_frame(latest: SnapshotRef) -> pd.DataFrame:
+    """Client rows of a snapshot, from this worker's memory when it already holds them"""
+    if _client_table is not None and _client_table.snapshot_id == latest.snapshot_id:
+        return _client_table.frame
+    if _metrics_snapshot is not None and _metrics_snapshot.snapshot_id == latest.snapshot_id:
+        return _metrics_snapshot.current_data
+    return await load_snapshot_clients(latest)
+
+# Cold loads in flight, so concurrent requests after another worker's ingest
+# share one read of the snapshot instead of each loading every client row
+_snapshot_loads: Dict[Tuple[str, str], asyncio.Task] = {}
+
+async def load_once(kind: str, snapshot_id: str, load: Callable[[], Awaitable[Any]]) -> Any:
+    """Run load() once per (kind, snapshot_id) among concurrent callers"""
+    key = (kind, snapshot_id)
+    task = _snapshot_loads.get(key)
+    if task is None:
+        task = asyncio.create_task(load())
+        _snapshot_loads[key] = task
         
-        # OLP calculation
-        metrics[key].olpAmount += item.olp
+        def done(finished: asyncio.Task):
+            _snapshot_loads.pop(key, None)
+            # Every waiter may have gone; retrieving the error keeps it from being reported as lost
+            if not finished.cancelled():
+                finished.exception()
+        task.add_done_callback(done)
+    # A caller that disconnects must not cancel the load the others are waiting on
+    return await asyncio.shield(task)
+
+async def get_client_table() -> ClientTable:
+    """Client table of the latest snapshot, loaded once per snapshot"""
+    latest = await require_latest_snapshot()
+    if _client_table is not None and _client_table.snapshot_id == latest.snapshot_id:
+        return _client_table
+    return await load_once("client_table", latest.snapshot_id, lambda: load_client_table(latest))
+
+async def load_client_table(latest: SnapshotRef) -> ClientTable:
+    global _client_table
+    frame = await latest_client_frame(latest)
+    _client_table = await asyncio.to_thread(ClientTable, latest.snapshot_id, frame)
+    return _client_table
+
+# Dashboard payloads are built from already-typed snapshot data, so they are
+# encoded straight to bytes instead of being re-validated through response_model
+def encode_dashboard_data(total_metrics: Dict[str, Any], branch_metrics: List[Dict[str, Any]],
+                          co_metrics: List[Dict[str, Any]]) -> bytes:
+    return orjson.dumps(
+        {"totalMetrics": total_metrics, "branchMetrics": branch_metrics, "coMetrics": co_metrics},
+        option=orjson.OPT_SERIALIZE_NUMPY
+    )
+
+# Client pages are sliced from the typed client table, so they skip ClientPage
+# validation the same way; response_model still documents the shape
+def encode_client_page(total: int, next_cursor: Optional[str], frame: pd.DataFrame) -> bytes:
+    return orjson.dumps(
+        {"total": total, "nextCursor": next_cursor, "clients": frame.to_dict('records')},
+        option=orjson.OPT_SERIALIZE_NUMPY
+    )
+
+def json_body_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+# Content codings in order of preference, compressed at most once per snapshot
+DASHBOARD_ENCODINGS = {
+    **({"br": lambda body: brotli.compress(body, quality=9)} if brotli else {}),
+    "gzip": lambda body: gzip.compress(body, compresslevel=9),
+}
+
+class EncodedDashboardBody:
+    """The encoded dashboard payload of one snapshot and its compressed variants"""
     
-    # Process last month data for "Last Month Till" calculations
-    for item in last_month_data:
-        key = item.branch if view_type == 'Branch' else item.co
-        if key in metrics and item.currentRecTotal > 2:
-            metrics[key].lastMonthTillClients += 1
-            metrics[key].lastMonthTillAmount += item.currentRecTotal
+    def __init__(self, snapshot_id: str, body: bytes, variant: str = ''):
+        self.snapshot_id = snapshot_id
+        self.body = body
+        self.etag = f'W/"{snapshot_id}-{variant}"' if variant else f'W/"{snapshot_id}"'
+        self._compressed: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
     
-    # Calculate recovery percentages
-    for key, data in metrics.items():
-        if data.currentDueAmount > 0:
-            data.recoveryPercentage = round((data.currentRecoveredAmount / data.currentDueAmount) * 100, 2)
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Weak comparison against an If-None-Match header"""
+        if not if_none_match:
+            return False
+        opaque = self.etag[2:]
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or any((tag[2:] if tag.startswith('W/') else tag) == opaque for tag in tags)
     
-    return metrics
+    def encoded(self, coding: str) -> bytes:
+        with self._lock:
+            if coding not in self._compressed:
+                self._compressed[coding] = DASHBOARD_ENCODINGS[coding](self.body)
+            return self._compressed[coding]
 
-@api_router.post("/upload-excel", response_model=ProcessedDashboardData)
+_dashboard_body: Optional[EncodedDashboardBody] = None
+
+# Projected dashboard queries (view/keys/fields), encoded once per snapshot
+DASHBOARD_QUERY_CACHE_SIZE = int(os.environ.get('DASHBOARD_QUERY_CACHE_SIZE', '64'))
+
+class DashboardQuery(NamedTuple):
+    views: Tuple[str, ...]
+    keys: Optional[Tuple[str, ...]]
+    fields: Tuple[str, ...]
+    
+    @property
+    def variant(self) -> str:
+        return hashlib.sha1(repr(self).encode()).hexdigest()[:12]
+    
+    def pipeline(self, match: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Aggregation that filters and projects the metric arrays inside Mongo"""
+        project = {"_id": 0, "total_metrics": 1}
+        for view in self.views:
+            metrics: Any = f"${GROUP_VIEWS[view]}_metrics"
+            if self.keys is not None:
+                metrics = {"$filter": {"input": metrics, "as": "m", "cond": {"$in": ["$$m.key", list(self.keys)]}}}
+            project[f"{GROUP_VIEWS[view]}_metrics"] = {
+                "$map": {"input": metrics, "as": "m", "in": {field: f"$$m.{field}" for field in self.fields}}
+            }
+        return [{"$match": match}, {"$limit": 1}, {"$project": project}]
+    
+    def encode(self, document: Dict[str, Any]) -> bytes:
+        payload = {"totalMetrics": document["total_metrics"]}
+        for view in self.views:
+            payload[f"{GROUP_VIEWS[view]}Metrics"] = document[f"{GROUP_VIEWS[view]}_metrics"]
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+class DashboardQueryCache:
+    """Encoded bodies of recent projected queries against the latest snapshot"""
+    
+    def __init__(self, size: int):
+        self.size = size
+        self.snapshot_id: Optional[str] = None
+        self._bodies: "OrderedDict[DashboardQuery, EncodedDashboardBody]" = OrderedDict()
+    
+    def get(self, snapshot_id: str, query: DashboardQuery) -> Optional[EncodedDashboardBody]:
+        if snapshot_id != self.snapshot_id:
+            self.snapshot_id = snapshot_id
+            self._bodies.clear()
+        encoded = self._bodies.get(query)
+        if encoded is not None:
+            self._bodies.move_to_end(query)
+        return encoded
+    
+    def put(self, query: DashboardQuery, encoded: EncodedDashboardBody) -> None:
+        if encoded.snapshot_id != self.snapshot_id:
+            return
+        self._bodies[query] = encoded
+        while len(self._bodies) > self.size:
+            self._bodies.popitem(last=False)
+
+_dashboard_queries = DashboardQueryCache(DASHBOARD_QUERY_CACHE_SIZE)
+
+# Snapshot storage: a small header in dashboard_data, one snapshot_metrics row per
+# group and one snapshot_clients row per client, so no document grows with the portfolio
+SNAPSHOT_LAYOUT = 2
+CLIENT_INSERT_BATCH = int(os.environ.get('CLIENT_INSERT_BATCH', '5000'))
+CLIENT_INSERT_CONCURRENCY = int(os.environ.get('CLIENT_INSERT_CONCURRENCY', '4'))
+FULL_DASHBOARD_QUERY = DashboardQuery(tuple(GROUP_VIEWS), None, tuple(DashboardMetrics.model_fields))
+
+# With SNAPSHOT_STORAGE=gridfs, the client table and each aggregate table are instead
+# written as zstd-compressed Arrow IPC files in GridFS, next to the same header
+SNAPSHOT_STORAGE = os.environ.get('SNAPSHOT_STORAGE', 'documents')
+SNAPSHOT_BLOB_LAYOUT = 3
+SNAPSHOT_BLOB_BUCKET = 'snapshot_blobs'
+_snapshot_bucket: Optional[AsyncIOMotorGridFSBucket] = None
+
+def get_snapshot_bucket() -> AsyncIOMotorGridFSBucket:
+    global _snapshot_bucket
+    if _snapshot_bucket is None:
+        _snapshot_bucket = AsyncIOMotorGridFSBucket(db, bucket_name=SNAPSHOT_BLOB_BUCKET)
+    return _snapshot_bucket
+
+def encode_snapshot_blob(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression='zstd')) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def decode_snapshot_blob(data: bytes) -> pa.Table:
+    """Arrow columns are decompressed once and then referenced, not copied or parsed row by row"""
+    return pa.ipc.open_file(pa.py_buffer(data)).read_all()
+
+def snapshot_blob_tables(metrics_by_view: Dict[str, List[Dict[str, Any]]], clients: pd.DataFrame) -> Dict[str, bytes]:
+    tables = {"clients": pa.Table.from_pandas(clients, preserve_index=False)}
+    for view, rows in metrics_by_view.items():
+        tables[f"{GROUP_VIEWS[view]}-metrics"] = pa.Table.from_pylist(rows, schema=pa.schema([
+            (name, pa.string() if name == 'key' else pa.int64() if field.annotation is int else pa.float64())
+            for name, field in DashboardMetrics.model_fields.items()
+        ]))
+    return {name: encode_snapshot_blob(table) for name, table in tables.items()}
+
+async def read_snapshot_blob(header: Dict[str, Any], table: str) -> pa.Table:
+    """One streamed GridFS read of a snapshot table"""
+    grid_out = await get_snapshot_bucket().open_download_stream(header["blobs"][table])
+    data = await grid_out.read()
+    return await asyncio.to_thread(decode_snapshot_blob, data)
+
+async def store_snapshot_blobs(snapshot_id: str, total_metrics: Dict[str, Any],
+                               metrics_by_view: Dict[str, List[Dict[str, Any]]], clients: pd.DataFrame,
+                               yesterday_date: str = '', today_date: str = '', last_month_key: str = '') -> None:
+    bucket = get_snapshot_bucket()
+    blobs = {}
+    try:
+        encoded = await asyncio.to_thread(snapshot_blob_tables, metrics_by_view, clients)
+        for table, data in encoded.items():
+            blobs[table] = await bucket.upload_from_stream(
+                f"{snapshot_id}/{table}.arrow", data, metadata={"snapshot_id": snapshot_id, "table": table}
+            )
+        await db.dashboard_data.insert_one({
+            "snapshot_id": snapshot_id,
+            "timestamp": datetime.utcnow(),
+            "layout": SNAPSHOT_BLOB_LAYOUT,
+            "total_metrics": total_metrics,
+            "client_count": len(clients),
+            "yesterday_date": yesterday_date,
+            "today_date": today_date,
+            "last_month_key": last_month_key,
+            "blobs": blobs
+        })
+    except BaseException:
+        await asyncio.gather(*[bucket.delete(file_id) for file_id in blobs.values()], return_exceptions=True)
+        raise
+
+async def insert_client_rows(snapshot_id: str, frame: pd.DataFrame) -> None:
+    """Bulk-write client rows in unordered insert_many batches, a few batches in flight at a time"""
+    limit = asyncio.Semaphore(CLIENT_INSERT_CONCURRENCY)
+    
+    async def write(start: int):
+        async with limit:
+            rows = frame.iloc[start:start + CLIENT_INSERT_BATCH].to_dict('records')
+            for row in rows:
+                row["snapshot_id"] = snapshot_id
+            await db.snapshot_clients.insert_many(rows, ordered=False)
+    
+    await asyncio.gather(*[write(start) for start in range(0, len(frame), CLIENT_INSERT_BATCH)])
+
+async def store_snapshot(snapshot_id: str, total_metrics: Dict[str, Any],
+                         metrics_by_view: Dict[str, List[Dict[str, Any]]], clients: pd.DataFrame,
+                         yesterday_date: str = '', today_date: str = '', last_month_key: str = '') -> None:
+    """Write client rows and aggregates, then the header that makes the snapshot visible"""
+    if SNAPSHOT_STORAGE == 'gridfs':
+        return await store_snapshot_blobs(snapshot_id, total_metrics, metrics_by_view, clients,
+                                          yesterday_date, today_date, last_month_key)
+    try:
+        await insert_client_rows(snapshot_id, clients)
+        metric_rows = [
+            {"snapshot_id": snapshot_id, "view": view, "position": position, **row}
+            for view, rows in metrics_by_view.items() for position, row in enumerate(rows)
+        ]
+        if metric_rows:
+            await db.snapshot_metrics.insert_many(metric_rows, ordered=False)
+        await db.dashboard_data.insert_one({
+            "snapshot_id": snapshot_id,
+            "timestamp": datetime.utcnow(),
+            "layout": SNAPSHOT_LAYOUT,
+            "total_metrics": total_metrics,
+            "client_count": len(clients),
+            "yesterday_date": yesterday_date,
+            "today_date": today_date,
+            "last_month_key": last_month_key
+        })
+    except BaseException:
+        await asyncio.gather(
+            db.snapshot_clients.delete_many({"snapshot_id": snapshot_id}),
+            db.snapshot_metrics.delete_many({"snapshot_id": snapshot_id}),
+            return_exceptions=True
+        )
+        raise
+
+async def load_snapshot_aggregates(latest: SnapshotRef, query: DashboardQuery) -> Dict[str, Any]:
+    """total_metrics and the requested <view>_metrics lists, from any storage layout"""
+    header = await db.dashboard_data.find_one(latest.filter, projection={"total_metrics": 1, "layout": 1, "blobs": 1})
+    if not header:
+        raise HTTPException(status_code=404, detail="Latest snapshot is no longer stored")
+    
+    if header.get("layout") == SNAPSHOT_BLOB_LAYOUT:
+        document = {"total_metrics": header["total_metrics"]}
+        for view in query.views:
+            table = (await read_snapshot_blob(header, f"{GROUP_VIEWS[view]}-metrics")).select(list(query.fields))
+            rows = table.to_pylist()
+            if query.keys is not None:
+                keys = set(query.keys)
+                rows = [row for row in rows if row["key"] in keys]
+            document[f"{GROUP_VIEWS[view]}_metrics"] = rows
+        return document
+    
+    if header.get("layout") != SNAPSHOT_LAYOUT:
+        # Earlier layouts keep the metric lists on the dashboard_data document
+        documents = await db.dashboard_data.aggregate(query.pipeline(latest.filter)).to_list(1)
+        return documents[0]
+    
+    criteria: Dict[str, Any] = {"snapshot_id": latest.snapshot_id, "view": {"$in": list(query.views)}}
+    if query.keys is not None:
+        criteria["key"] = {"$in": list(query.keys)}
+    projection = {"_id": 0, "view": 1, **{field: 1 for field in query.fields}}
+    rows = await db.snapshot_metrics.find(criteria, projection).sort([("view", 1), ("position", 1)]).to_list(None)
+    
+    document = {"total_metrics": header["total_metrics"], **{f"{GROUP_VIEWS[view]}_metrics": [] for view in query.views}}
+    for row in rows:
+        document[f"{GROUP_VIEWS[row.pop('view')]}_metrics"].append(row)
+    return document
+
+async def load_snapshot_clients(latest: SnapshotRef) -> pd.DataFrame:
+    """Client rows of a stored snapshot in srNo order, from any storage layout"""
+    header = await db.dashboard_data.find_one(latest.filter, projection={"layout": 1, "blobs": 1, "clients_pruned": 1})
+    if not header:
+        raise HTTPException(status_code=404, detail="Latest snapshot is no longer stored")
+    if header.get("clients_pruned"):
+        raise HTTPException(status_code=404, detail="Client rows of this snapshot were dropped by the retention policy")
+    if header.get("layout") == SNAPSHOT_BLOB_LAYOUT:
+        table = await read_snapshot_blob(header, "clients")
+        return await asyncio.to_thread(table.to_pandas)
+    if header.get("layout") == SNAPSHOT_LAYOUT:
+        rows = await db.snapshot_clients.find(
+            {"snapshot_id": latest.snapshot_id}, {"_id": 0, "snapshot_id": 0}
+        ).sort("srNo", 1).to_list(None)
+        return pd.DataFrame(rows, columns=CLIENT_FIELDS)
+    document = await db.dashboard_data.find_one(latest.filter, projection={"clients": 1, "branch_metrics.clients": 1})
+    return frame_from_stored_clients(document)
+
+# Historical metrics are recomputed from stored client rows, either by a Mongo
+# $group pipeline that returns one document per group or by loading the rows
+HISTORY_QUERY_CONCURRENCY = int(os.environ.get('HISTORY_QUERY_CONCURRENCY', '4'))
+
+def metrics_pipeline(snapshot_id: str, view: str, yesterday_date: str, today_date: str,
+                     keys: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """METRIC_RULES as a $group over one snapshot's client rows, served by the (snapshot_id, <view>) index"""
+    column = GROUP_VIEWS[view]
+    match = {"snapshot_id": snapshot_id}
+    if keys is not None:
+        match[column] = {"$in": keys}
+    sums = {"activeCount": {"$sum": 1}, "olpAmount": {"$sum": "$olp"}}
+    for prefix, source, conditions in METRIC_RULES:
+        matched = rule_expression(conditions, yesterday_date, today_date)
+        sums[f"{prefix}Clients"] = {"$sum": {"$cond": [matched, 1, 0]}}
+        sums[f"{prefix}Amount"] = {"$sum": {"$cond": [matched, f"${source}", 0]}}
+    return [{"$match": match}, {"$group": {"_id": f"${column}", **sums}}]
+
+async def group_sums_mongo(header: Dict[str, Any], view: str, keys: Optional[List[str]]) -> Tuple[List[str], np.ndarray]:
+    pipeline = metrics_pipeline(header["snapshot_id"], view, header["yesterday_date"], header["today_date"], keys)
+    groups = await db.snapshot_clients.aggregate(pipeline).to_list(None)
+    sums = np.array([[group[field] for group in groups] for field in CONTRIBUTION_FIELDS], dtype=np.float64)
+    return [group["_id"] for group in groups], sums.reshape(len(CONTRIBUTION_FIELDS), len(groups))
+
+async def group_sums_python(header: Dict[str, Any], view: str, keys: Optional[List[str]]) -> Tuple[List[str], np.ndarray]:
+    frame = await load_snapshot_clients(SnapshotRef(header["snapshot_id"], {"_id": header["_id"]}))
+    contributions = build_contributions(frame, header["yesterday_date"], header["today_date"])
+    codes, groups = pd.factorize(frame[GROUP_VIEWS[view]], sort=False)
+    return list(groups), reduce_by_group(codes, len(groups), contributions)
+
+# The engines add amounts in different orders and precisions (Mongo's $sum is
+# compensated, np.bincount is not), so recomputed amounts are rounded to cents
+AMOUNT_ROWS = [i for i, name in enumerate(CONTRIBUTION_FIELDS) if name.endswith('Amount')]
+AMOUNT_FIELDS = {CONTRIBUTION_FIELDS[i] for i in AMOUNT_ROWS}
+
+def round_amounts(sums: np.ndarray) -> np.ndarray:
+    rounded = sums.copy()
+    rounded[AMOUNT_ROWS] = np.round(sums[AMOUNT_ROWS], 2)
+    return rounded
+
+async def snapshot_group_metrics(header: Dict[str, Any], view: str, keys: Optional[List[str]],
+                                 engine: str) -> SnapshotMetricsHistory:
+    """Recompute one stored snapshot's metrics for a view, in its stored group order.
+
+    Last month's rows are not stored, so "Last Month Till" comes from the
+    snapshot's stored aggregates. Only snapshots stored as client rows can be
+    aggregated inside Mongo; the python engine recomputes the other layouts
+    for either engine.
+    """
+    latest = SnapshotRef(header["snapshot_id"], {"_id": header["_id"]})
+    if header.get("clients_pruned"):
+        # Pinned snapshots past the retention window keep only their stored aggregates
+        document = await load_snapshot_aggregates(latest, FULL_DASHBOARD_QUERY._replace(views=(view,), keys=tuple(keys) if keys is not None else None))
+        metrics = [{field: round(value, 2) if field in AMOUNT_FIELDS else value for field, value in row.items()}
+                   for row in document[f"{GROUP_VIEWS[view]}_metrics"]]
+        return SnapshotMetricsHistory(snapshotId=header["snapshot_id"], timestamp=header["timestamp"], metrics=metrics)
+    query = DashboardQuery((view,), None, ('key', 'lastMonthTillClients', 'lastMonthTillAmount'))
+    group_sums = group_sums_mongo if engine == 'mongo' and header.get("layout") == SNAPSHOT_LAYOUT else group_sums_python
+    (groups, sums), stored = await asyncio.gather(group_sums(header, view, keys), load_snapshot_aggregates(latest, query))
+    sums = round_amounts(sums)
+    
+    columns = {key: i for i, key in enumerate(groups)}
+    wanted = set(keys) if keys is not None else columns
+    stored = [row for row in stored[f"{GROUP_VIEWS[view]}_metrics"] if row["key"] in columns and row["key"] in wanted]
+    last_month_till = np.array([[row["lastMonthTillClients"] for row in stored],
+                                [row["lastMonthTillAmount"] for row in stored]]).reshape(2, len(stored))
+    metrics = build_dashboard_metrics([row["key"] for row in stored], sums[:, [columns[row["key"]] for row in stored]],
+                                      last_month_till)
+    return SnapshotMetricsHistory(snapshotId=header["snapshot_id"], timestamp=header["timestamp"],
+                                  metrics=list(metrics.values()))
+
+# Trend rows: one compact document per (date, view, key) with the numeric metric
+# fields, so a group's history is an index range scan instead of whole snapshots.
+# The last upload of a day replaces that day's rows
+TREND_FIELDS = [name for name in DashboardMetrics.model_fields if name != 'key']
+TREND_BUCKETS = ('day', 'week', 'month')
+
+def trend_date(today_date: str) -> datetime:
+    """The business day an upload describes: its today filter, else the upload day (UTC)"""
+    try:
+        return datetime(1970, 1, 1) + timedelta(days=parse_day_ordinal(today_date))
+    except HTTPException:
+        return datetime.combine(datetime.utcnow().date(), datetime.min.time())
+
+async def record_trends(snapshot_id: str, day: datetime, metrics_by_view: Dict[str, List[Dict[str, Any]]]) -> None:
+    writes = [
+        ReplaceOne({"view": view, "key": row["key"], "date": day},
+                   {"view": view, "key": row["key"], "date": day, "snapshot_id": snapshot_id,
+                    **{field: row[field] for field in TREND_FIELDS}},
+                   upsert=True)
+        for view, rows in metrics_by_view.items() for row in rows
+    ]
+    if writes:
+        await db.metric_trends.bulk_write(writes, ordered=False)
+
+def trend_bucket_start(day: datetime, bucket: str) -> datetime:
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+def downsample_trend(rows: List[Dict[str, Any]], bucket: str) -> List[Dict[str, Any]]:
+    """Keep the last day of each week or month, dated by the bucket start.
+
+    The metrics are month-to-date positions rather than daily flows, so a
+    bucket is represented by its closing values instead of a sum.
+    """
+    buckets = {}
+    for row in rows:
+        buckets[trend_bucket_start(row["date"], bucket)] = row
+    return [{**row, "date": start} for start, row in buckets.items()]
+
+# Retention: snapshots are kept while among the newest SNAPSHOT_KEEP_LAST or younger
+# than SNAPSHOT_TTL_DAYS (0 disables either rule). The last snapshot of each UTC day
+# stays pinned for SNAPSHOT_PIN_DAILY_DAYS, but only as its header and aggregates:
+# pinned snapshots lose their client rows, so storage grows by groups, not clients
+SNAPSHOT_KEEP_LAST = int(os.environ.get('SNAPSHOT_KEEP_LAST', '50'))
+SNAPSHOT_TTL_DAYS = float(os.environ.get('SNAPSHOT_TTL_DAYS', '0'))
+SNAPSHOT_PIN_DAILY_DAYS = int(os.environ.get('SNAPSHOT_PIN_DAILY_DAYS', '365'))
+UPLOAD_JOB_RETENTION_DAYS = int(os.environ.get('UPLOAD_JOB_RETENTION_DAYS', '7'))
+ORPHAN_ROWS_GRACE = timedelta(hours=1)
+
+def snapshots_to_prune(headers: List[Dict[str, Any]], now: datetime,
+                       current: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Headers (newest first) outside the retention policy, and those kept only by the daily pin.
+
+    The current snapshot is in neither list, whatever its age.
+    """
+    if not SNAPSHOT_KEEP_LAST and not SNAPSHOT_TTL_DAYS:
+        return [], []
+    keep = set(range(min(len(headers), SNAPSHOT_KEEP_LAST or 1)))
+    keep.update(i for i, header in enumerate(headers) if current is not None and header.get("snapshot_id") == current)
+    if SNAPSHOT_TTL_DAYS:
+        expires = now - timedelta(days=SNAPSHOT_TTL_DAYS)
+        keep.update(i for i, header in enumerate(headers) if header["timestamp"] >= expires)
+    pinned_since = (now - timedelta(days=SNAPSHOT_PIN_DAILY_DAYS)).date()
+    pinned, seen_days = set(), set()
+    for i, header in enumerate(headers):
+        day = header["timestamp"].date()
+        if day >= pinned_since and day not in seen_days:
+            seen_days.add(day)
+            pinned.add(i)
+    return ([header for i, header in enumerate(headers) if i not in keep and i not in pinned],
+            [header for i, header in enumerate(headers) if i in pinned and i not in keep])
+
+async def snapshot_rows_written_at(snapshot_id: str) -> Optional[datetime]:
+    """When the first row or blob of a snapshot was written (naive UTC)"""
+    row = await db.snapshot_clients.find_one({"snapshot_id": snapshot_id}, {"_id": 1}) \
+        or await db.snapshot_metrics.find_one({"snapshot_id": snapshot_id}, {"_id": 1}) \
+        or await db.snapshot_histograms.find_one({"snapshot_id": snapshot_id}, {"_id": 1})
+    if row:
+        return row["_id"].generation_time.replace(tzinfo=None)
+    blob = await db[f"{SNAPSHOT_BLOB_BUCKET}.files"].find_one({"metadata.snapshot_id": snapshot_id}, {"uploadDate": 1})
+    return blob["uploadDate"] if blob else None
+
+async def trim_pinned_snapshots(pinned: List[Dict[str, Any]]) -> None:
+    """Drop the client rows (and recovery histograms) of daily-pinned snapshots, keeping their header and aggregates"""
+    if not pinned:
+        return
+    snapshot_ids = [header["snapshot_id"] for header in pinned]
+    # Mark the headers first, so nothing tries to read rows that are being deleted
+    await db.dashboard_data.update_many(
+        {"_id": {"$in": [header["_id"] for header in pinned]}},
+        {"$set": {"clients_pruned": True}, "$unset": {"blobs.clients": ""}}
+    )
+    blobs = [header["blobs"]["clients"] for header in pinned if header.get("blobs", {}).get("clients")]
+    await asyncio.gather(
+        db.snapshot_clients.delete_many({"snapshot_id": {"$in": snapshot_ids}}),
+        db.snapshot_histograms.delete_many({"snapshot_id": {"$in": snapshot_ids}}),
+        *[get_snapshot_bucket().delete(file_id) for file_id in blobs]
+    )
+    logger.info(f"Dropped the client rows of {len(pinned)} pinned snapshots")
+
+async def prune_snapshots() -> None:
+    """Drop snapshots outside the retention policy, with their rows, plus rows left by failed writes"""
+    headers = await db.dashboard_data.find(
+        {}, {"snapshot_id": 1, "timestamp": 1, "blobs.clients": 1, "clients_pruned": 1}
+    ).sort("timestamp", -1).to_list(None)
+    current = snapshot_generation.latest.snapshot_id if snapshot_generation.latest else None
+    expired, pinned = snapshots_to_prune(headers, datetime.utcnow(), current)
+    await trim_pinned_snapshots([
+        header for header in pinned if header.get("snapshot_id") is not None and not header.get("clients_pruned")
+    ])
+    
+    blob_files = db[f"{SNAPSHOT_BLOB_BUCKET}.files"]
+    stored = {header.get("snapshot_id") for header in headers} - {header.get("snapshot_id") for header in expired}
+    row_owners = set(await db.snapshot_clients.distinct("snapshot_id")) | set(await db.snapshot_metrics.distinct("snapshot_id")) \
+        | set(await db.snapshot_histograms.distinct("snapshot_id")) | set(await blob_files.distinct("metadata.snapshot_id"))
+    orphans = []
+    for snapshot_id in row_owners - stored:
+        # Rows of a snapshot still being written have no header yet either
+        written_at = await snapshot_rows_written_at(snapshot_id)
+        if written_at is not None and datetime.utcnow() - written_at > ORPHAN_ROWS_GRACE:
+            orphans.append(snapshot_id)
+    
+    doomed = [header["snapshot_id"] for header in expired if header.get("snapshot_id")] + orphans
+    if expired:
+        await db.dashboard_data.delete_many({"_id": {"$in": [header["_id"] for header in expired]}})
+    if doomed:
+        blobs = await blob_files.find({"metadata.snapshot_id": {"$in": doomed}}, {"_id": 1}).to_list(None)
+        await asyncio.gather(
+            db.snapshot_clients.delete_many({"snapshot_id": {"$in": doomed}}),
+            db.snapshot_metrics.delete_many({"snapshot_id": {"$in": doomed}}),
+            db.snapshot_histograms.delete_many({"snapshot_id": {"$in": doomed}}),
+            *[get_snapshot_bucket().delete(blob["_id"]) for blob in blobs]
+        )
+        logger.info(f"Pruned {len(expired)} expired snapshots and {len(orphans)} orphaned row sets")
+    await prune_last_month_rows()
+
+async def prune_last_month_rows() -> None:
+    """Drop stored last-month files no snapshot refers to any more"""
+    referenced = set(await db.dashboard_data.distinct("last_month_key", {"clients_pruned": {"$ne": True}}))
+    # A set being written for an upload whose header is not stored yet is younger than the grace period
+    unused = [
+        marker["_id"] for marker in await db.last_month_sets.find(
+            {"storedAt": {"$lt": datetime.utcnow() - ORPHAN_ROWS_GRACE}}, {"_id": 1}
+        ).to_list(None)
+        if marker["_id"] not in referenced
+    ]
+    if unused:
+        await db.last_month_clients.delete_many({"month_key": {"$in": unused}})
+        await db.last_month_sets.delete_many({"_id": {"$in": unused}})
+        logger.info(f"Pruned {len(unused)} unused last-month files")
+
+_background_tasks: set = set()
+
+def run_in_background(coroutine: Awaitable, description: str) -> None:
+    """Fire-and-forget a coroutine, keeping a reference and logging its failure"""
+    async def guarded():
+        try:
+            await coroutine
+        except Exception as e:
+            logger.error(f"{description} failed: {e}")
+    task = asyncio.create_task(guarded())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def ensure_indexes() -> None:
+    await asyncio.gather(
+        db.dashboard_data.create_index([("timestamp", -1)]),
+        db.dashboard_data.create_index([("snapshot_id", 1)]),
+        db.upload_jobs.create_index([("phase", 1), ("heartbeatAt", 1)]),
+        db.upload_jobs.create_index([("workerId", 1), ("phase", 1)]),
+        db.upload_jobs.create_index([("finishedAt", 1)], expireAfterSeconds=UPLOAD_JOB_RETENTION_DAYS * 86400),
+        db.snapshot_clients.create_index(EXPORT_CLIENTS_INDEX),
+        db.snapshot_clients.create_index([("snapshot_id", 1), ("branch", 1)]),
+        db.snapshot_clients.create_index([("snapshot_id", 1), ("co", 1)]),
+        db.snapshot_metrics.create_index([("snapshot_id", 1), ("view", 1), ("position", 1)]),
+        db.snapshot_metrics.create_index([("snapshot_id", 1), ("view", 1), ("key", 1)]),
+        db.snapshot_histograms.create_index([("snapshot_id", 1), ("view", 1), ("position", 1)]),
+        db.last_month_clients.create_index([("month_key", 1), ("position", 1)]),
+        db.metric_trends.create_index([("view", 1), ("key", 1), ("date", 1)], unique=True),
+        db[f"{SNAPSHOT_BLOB_BUCKET}.files"].create_index([("metadata.snapshot_id", 1)])
+    )
+
+def parse_list_param(value: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated query parameter"""
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def dashboard_query(view: Optional[str], keys: Optional[str], fields: Optional[str]) -> Optional[DashboardQuery]:
+    """The projection requested on /api/dashboard-data, or None for the full payload"""
+    if view is None and keys is None and fields is None:
+        return None
+    views = tuple(GROUP_VIEWS)
+    if view is not None:
+        views = (resolve_view(view),)
+    
+    selected = list(DashboardMetrics.model_fields)
+    if fields is not None:
+        requested = parse_list_param(fields)
+        unknown = [field for field in requested if field not in DashboardMetrics.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        # key identifies each row, so it is always kept
+        selected = [field for field in selected if field == 'key' or field in requested]
+    
+    key_list = parse_list_param(keys)
+    return DashboardQuery(views, tuple(key_list) if key_list is not None else None, tuple(selected))
+
+async def dashboard_body_response(cached: EncodedDashboardBody, if_none_match: Optional[str],
+                                  accept_encoding: Optional[str]) -> Response:
+    """304 for a matching ETag, otherwise the body in the best accepted coding"""
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if cached.matches(if_none_match):
+        return Response(status_code=304, headers=headers)
+    
+    coding = negotiate_encoding(accept_encoding)
+    if coding is None:
+        return Response(content=cached.body, media_type="application/json", headers=headers)
+    body = await asyncio.to_thread(cached.encoded, coding)
+    return Response(content=body, media_type="application/json", headers={**headers, "Content-Encoding": coding})
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Preferred coding from DASHBOARD_ENCODINGS the client accepts, if any"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for coding in DASHBOARD_ENCODINGS:
+        if accepted.get(coding, accepted.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+def validate_upload_names(current_month_file: SpooledUpload, last_month_file: SpooledUpload) -> None:
+    if not detect_upload_format(current_month_file.file_name):
+        raise HTTPException(status_code=400, detail="Current month file must be Excel, CSV, Parquet or Arrow format")
+    if not detect_upload_format(last_month_file.file_name):
+        raise HTTPException(status_code=400, detail="Last month file must be Excel, CSV, Parquet or Arrow format")
+
+async def ingest_uploads(spooled: List[SpooledUpload], yesterday_date: str, today_date: str,
+                         incremental: bool, job: Optional['UploadJob'] = None) -> EncodedDashboardBody:
+    """Parse, compute and store one current/last month pair of spooled uploads"""
+    global _dashboard_body, _client_table
+    
+    # Parse both uploads in parallel in the parse pool
+    if job is not None:
+        await job.advance('parsing')
+    current_data, last_month_data = await process_excel_files(*spooled, on_parsed=job.parsed if job else None)
+    
+    if current_data.empty:
+        raise HTTPException(status_code=400, detail="No valid data found in current month file")
+    if last_month_data.empty:
+        raise HTTPException(status_code=400, detail="No valid data found in last month file")
+    
+    # Calculate metrics for both views in one pass, or as a delta against the last upload
+    if job is not None:
+        await job.advance('computing')
+    snapshot = await asyncio.to_thread(update_metrics_snapshot, current_data, last_month_data, yesterday_date,
+                                       today_date, last_month_key=spooled[1].sha256, incremental=incremental)
+    metrics_by_view = snapshot.metrics()
+    
+    # Convert to lists
+    branch_metrics = list(metrics_by_view['Branch'].values())
+    co_metrics = list(metrics_by_view['CO'].values())
+    
+    # Calculate total metrics
+    total_metrics = {
+        "totalActiveClients": sum(m.activeCount for m in branch_metrics),
+        "totalCurrentDueAmount": sum(m.currentDueAmount for m in branch_metrics),
+        "totalCurrentRecoveredAmount": sum(m.currentRecoveredAmount for m in branch_metrics),
+        "totalRecoveryPercentage": 0
+    }
+    
+    if total_metrics["totalCurrentDueAmount"] > 0:
+        total_metrics["totalRecoveryPercentage"] = round(
+            (total_metrics["totalCurrentRecoveredAmount"] / total_metrics["totalCurrentDueAmount"]) * 100, 2
+        )
+    
+    # Store the snapshot: header, per-group aggregates and client rows in their own collections
+    if job is not None:
+        await job.advance('storing')
+    snapshot.snapshot_id = str(uuid.uuid4())
+    metric_rows = {"Branch": [m.dict() for m in branch_metrics], "CO": [m.dict() for m in co_metrics]}
+    body = encode_dashboard_data(total_metrics, metric_rows["Branch"], metric_rows["CO"])
+    
+    async def store():
+        # Histogram rows go first: the snapshot's header, written last, makes it visible
+        await store_recovery_histograms(snapshot)
+        await store_snapshot(snapshot.snapshot_id, total_metrics, metric_rows, current_data,
+                             yesterday_date, today_date, spooled[1].sha256)
+    
+    # The client table's sort orders and overdue rankings are built while the rows are
+    # written, so the first /clients, /top-overdue or export after publishing is already hot
+    await store_last_month_rows(spooled[1].sha256, last_month_data)
+    client_table, _ = await asyncio.gather(asyncio.to_thread(ClientTable, snapshot.snapshot_id, current_data), store())
+    
+    _dashboard_body = EncodedDashboardBody(snapshot.snapshot_id, body)
+    _client_table = client_table
+    await snapshot_generation.publish(snapshot.snapshot_id)
+    snapshot_events.publish(snapshot.snapshot_id, total_metrics, metric_rows)
+    # Trend rows are derived data: a failed write must not keep the snapshot from being published
+    run_in_background(record_trends(snapshot.snapshot_id, trend_date(today_date), metric_rows), "Trend write")
+    run_in_background(prune_snapshots(), "Snapshot retention")
+    return _dashboard_body
+
+@api_router.post("/upload-excel", response_model=ProcessedDashboardData, openapi_extra=UPLOAD_REQUEST_BODY)
 async def upload_excel_files(
-    current_month_file: UploadFile = File(...),
-    last_month_file: UploadFile = File(...),
+    request: Request,
     yesterday_date: str = '',
-    today_date: str = ''
+    today_date: str = '',
+    incremental: bool = True
 ):
     """Upload and process Excel files for dashboard data"""
     
     try:
-        # Validate file types
-        if not current_month_file.filename.endswith(('.xlsx', '.xls')):
-            raise HTTPException(status_code=400, detail="Current month file must be Excel format")
-        if not last_month_file.filename.endswith(('.xlsx', '.xls')):
-            raise HTTPException(status_code=400, detail="Last month file must be Excel format")
-        
-        # Read file contents
-        current_content = await current_month_file.read()
-        last_month_content = await last_month_file.read()
-        
-        # Process Excel files
-        current_data = process_excel_file(current_content, current_month_file.filename)
-        last_month_data = process_excel_file(last_month_content, last_month_file.filename)
-        
-        if not current_data:
-            raise HTTPException(status_code=400, detail="No valid data found in current month file")
-        if not last_month_data:
-            raise HTTPException(status_code=400, detail="No valid data found in last month file")
+        # Stream both uploads to spool files, then parse, compute and store them
+        spooled = []
+        try:
+            spooled = await spool_multipart(request)
+            validate_upload_names(*spooled)
+            encoded = await ingest_uploads(spooled, yesterday_date, today_date, incremental)
+        finally:
+            discard_spooled(*spooled)
         
-        # Calculate metrics for both views
-        branch_metrics_dict = calculate_metrics(current_data, last_month_data, 'Branch', yesterday_date, today_date)
-        co_metrics_dict = calculate_metrics(current_data, last_month_data, 'CO', yesterday_date, today_date)
-        
-        # Convert to lists
-        branch_metrics = list(branch_metrics_dict.values())
-        co_metrics = list(co_metrics_dict.values())
-        
-        # Calculate total metrics
-        total_metrics = {
-            "totalActiveClients": sum(m.activeCount for m in branch_metrics),
-            "totalCurrentDueAmount": sum(m.currentDueAmount for m in branch_metrics),
-            "totalCurrentRecoveredAmount": sum(m.currentRecoveredAmount for m in branch_metrics),
-            "totalRecoveryPercentage": 0
-        }
-        
-        if total_metrics["totalCurrentDueAmount"] > 0:
-            total_metrics["totalRecoveryPercentage"] = round(
-                (total_metrics["totalCurrentRecoveredAmount"] / total_metrics["totalCurrentDueAmount"]) * 100, 2
-            )
-        
-        # Store processed data in database for caching
-        dashboard_data = {
-            "timestamp": datetime.utcnow(),
-            "total_metrics": total_metrics,
-            "branch_metrics": [m.dict() for m in branch_metrics],
-            "co_metrics": [m.dict() for m in co_metrics]
-        }
-        
-        await db.dashboard_data.insert_one(dashboard_data)
-        
-        return ProcessedDashboardData(
-            totalMetrics=total_metrics,
-            branchMetrics=branch_metrics,
-            coMetrics=co_metrics
-        )
+        return json_body_response(encoded.body)
         
     except HTTPException:
         raise
@@ -335,22 +2182,39 @@ async def upload_excel_files(
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @api_router.get("/dashboard-data", response_model=ProcessedDashboardData)
-async def get_latest_dashboard_data():
-    """Get the latest processed dashboard data"""
+async def get_latest_dashboard_data(
+    view: Optional[str] = None,
+    keys: Optional[str] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """Get the latest processed dashboard data, revalidated by snapshot ETag.
+
+    view=branch|co limits the payload to one metric list, keys= to the named
+    groups and fields= to the listed metric fields (key is always included).
+    """
+    global _dashboard_body
     try:
-        # Get the most recent dashboard data
-        latest_data = await db.dashboard_data.find_one(
-            sort=[("timestamp", -1)]
-        )
+        query = dashboard_query(view, keys, fields)
+        latest = await require_latest_snapshot()
         
-        if not latest_data:
-            raise HTTPException(status_code=404, detail="No dashboard data found. Please upload Excel files first.")
+        # Projections are filtered inside Mongo and cached per snapshot like the full body
+        if query is not None:
+            cached = _dashboard_queries.get(latest.snapshot_id, query)
+            if cached is None:
+                document = await load_snapshot_aggregates(latest, query)
+                cached = EncodedDashboardBody(latest.snapshot_id, query.encode(document), variant=query.variant)
+                _dashboard_queries.put(query, cached)
+            return await dashboard_body_response(cached, if_none_match, accept_encoding)
         
-        return ProcessedDashboardData(
-            totalMetrics=latest_data["total_metrics"],
-            branchMetrics=[DashboardMetrics(**m) for m in latest_data["branch_metrics"]],
-            coMetrics=[DashboardMetrics(**m) for m in latest_data["co_metrics"]]
-        )
+        # The encoded body only changes with the snapshot; hot reads are served from memory
+        if _dashboard_body is None or _dashboard_body.snapshot_id != latest.snapshot_id:
+            latest_data = await load_snapshot_aggregates(latest, FULL_DASHBOARD_QUERY)
+            _dashboard_body = EncodedDashboardBody(latest.snapshot_id, encode_dashboard_data(
+                latest_data["total_metrics"], latest_data["branch_metrics"], latest_data["co_metrics"]
+            ))
+        return await dashboard_body_response(_dashboard_body, if_none_match, accept_encoding)
         
     except HTTPException:
         raise
@@ -358,9 +2222,691 @@ async def get_latest_dashboard_data():
         logger.error(f"Error retrieving dashboard data: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+# Background upload jobs: the request only spools the files, a worker task runs
+# parse -> metrics -> store, and progress lives in the upload_jobs collection
+UPLOAD_JOB_WORKERS = int(os.environ.get('UPLOAD_JOB_WORKERS', '1'))
+UPLOAD_JOB_HEARTBEAT_SECONDS = float(os.environ.get('UPLOAD_JOB_HEARTBEAT_SECONDS', '10'))
+UPLOAD_JOB_STALE_SECONDS = 3 * UPLOAD_JOB_HEARTBEAT_SECONDS
+UPLOAD_JOB_ACTIVE_PHASES = ['queued', 'parsing', 'computing', 'storing']
+WORKER_ID = uuid.uuid4().hex
+
+_upload_job_queue: Optional[asyncio.Queue] = None
+_upload_job_tasks: List[asyncio.Task] = []
+# Bytes per second of finished jobs (moving average), used for ETAs
+_upload_throughput: Optional[float] = None
+
+class UploadJob:
+    """Progress of one background upload, mirrored to its upload_jobs document"""
+    
+    def __init__(self, job_id: str, uploads: List[SpooledUpload]):
+        self.job_id = job_id
+        self.total_bytes = sum(upload.size for upload in uploads)
+        self.parsed_bytes = 0
+        self.rows_processed = 0
+        self.started = time.monotonic()
+    
+    def eta(self) -> Optional[float]:
+        """Seconds left, from past throughput or else this job's parse rate"""
+        elapsed = time.monotonic() - self.started
+        if _upload_throughput:
+            estimate = self.total_bytes / _upload_throughput
+        elif self.parsed_bytes:
+            estimate = elapsed * self.total_bytes / self.parsed_bytes
+        else:
+            return None
+        return round(max(estimate - elapsed, 0.0), 1)
+    
+    async def advance(self, phase: str, **fields):
+        await db.upload_jobs.update_one({"_id": self.job_id}, {"$set": {
+            "phase": phase,
+            "rowsProcessed": self.rows_processed,
+            "etaSeconds": self.eta() if phase in UPLOAD_JOB_ACTIVE_PHASES else 0.0,
+            "updatedAt": datetime.utcnow(),
+            **fields
+        }})
+    
+    async def parsed(self, upload: SpooledUpload, rows: int):
+        self.parsed_bytes += upload.size
+        self.rows_processed += rows
+        await self.advance('parsing')
+
+def upload_job_status(document: Dict[str, Any]) -> UploadJobStatus:
+    return UploadJobStatus(
+        jobId=document["_id"],
+        phase=document["phase"],
+        rowsProcessed=document.get("rowsProcessed", 0),
+        etaSeconds=document.get("etaSeconds"),
+        snapshotId=document.get("snapshotId"),
+        error=document.get("error"),
+        createdAt=document["createdAt"],
+        updatedAt=document["updatedAt"]
+    )
+
+async def run_upload_job(job_id: str):
+    global _upload_throughput
+    document = await db.upload_jobs.find_one({"_id": job_id})
+    if document is None or document["phase"] not in UPLOAD_JOB_ACTIVE_PHASES:
+        return
+    spooled = [SpooledUpload(**upload) for upload in document["uploads"]]
+    job = UploadJob(job_id, spooled)
+    try:
+        encoded = await ingest_uploads(spooled, document["yesterdayDate"], document["todayDate"],
+                                       document["incremental"], job=job)
+        elapsed = time.monotonic() - job.started
+        if elapsed > 0:
+            throughput = job.total_bytes / elapsed
+            _upload_throughput = throughput if _upload_throughput is None else 0.7 * _upload_throughput + 0.3 * throughput
+        await job.advance('done', snapshotId=encoded.snapshot_id, finishedAt=datetime.utcnow())
+    except HTTPException as e:
+        await job.advance('failed', error=e.detail, finishedAt=datetime.utcnow())
+    except Exception as e:
+        logger.error(f"Upload job {job_id} failed: {e}")
+        await job.advance('failed', error=f"Internal server error: {str(e)}", finishedAt=datetime.utcnow())
+    finally:
+        discard_spooled(*spooled)
+
+async def upload_job_worker():
+    while True:
+        job_id = await _upload_job_queue.get()
+        try:
+            await run_upload_job(job_id)
+        except Exception as e:
+            logger.error(f"Upload job {job_id} could not be recorded: {e}")
+        finally:
+            _upload_job_queue.task_done()
+
+async def claim_stale_upload_jobs():
+    """Adopt active jobs whose worker stopped heartbeating, e.g. after a restart.
+
+    Jobs are rerun from their spool files (the parse cache usually makes that
+    cheap); if the files are gone the job is failed instead of left hanging.
+    """
+    while True:
+        now = datetime.utcnow()
+        document = await db.upload_jobs.find_one_and_update(
+            {"phase": {"$in": UPLOAD_JOB_ACTIVE_PHASES},
+             "heartbeatAt": {"$lt": now - timedelta(seconds=UPLOAD_JOB_STALE_SECONDS)}},
+            {"$set": {"workerId": WORKER_ID, "heartbeatAt": now, "phase": "queued", "updatedAt": now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if document is None:
+            return
+        if all(os.path.exists(upload["path"]) for upload in document["uploads"]):
+            logger.info(f"Resuming upload job {document['_id']}")
+            _upload_job_queue.put_nowait(document["_id"])
+        else:
+            await db.upload_jobs.update_one({"_id": document["_id"]}, {"$set": {
+                "phase": "failed", "error": "Upload files were lost when the server restarted; please upload again",
+                "updatedAt": now, "finishedAt": now
+            }})
+
+async def upload_job_heartbeat():
+    while True:
+        try:
+            await db.upload_jobs.update_many(
+                {"workerId": WORKER_ID, "phase": {"$in": UPLOAD_JOB_ACTIVE_PHASES}},
+                {"$set": {"heartbeatAt": datetime.utcnow()}}
+            )
+            await claim_stale_upload_jobs()
+        except Exception as e:
+            logger.error(f"Upload job heartbeat failed: {e}")
+        await asyncio.sleep(UPLOAD_JOB_HEARTBEAT_SECONDS)
+
+@api_router.post("/upload-jobs", response_model=UploadJobStatus, status_code=202, openapi_extra=UPLOAD_REQUEST_BODY)
+async def submit_upload_job(
+    request: Request,
+    yesterday_date: str = '',
+    today_date: str = '',
+    incremental: bool = True
+):
+    """Queue an upload for background processing; poll /api/jobs/{jobId} for progress"""
+    spooled = []
+    try:
+        spooled = await spool_multipart(request)
+        validate_upload_names(*spooled)
+        now = datetime.utcnow()
+        document = {
+            "_id": str(uuid.uuid4()),
+            "phase": "queued",
+            "rowsProcessed": 0,
+            "uploads": [upload._asdict() for upload in spooled],
+            "yesterdayDate": yesterday_date,
+            "todayDate": today_date,
+            "incremental": incremental,
+            "workerId": WORKER_ID,
+            "heartbeatAt": now,
+            "createdAt": now,
+            "updatedAt": now
+        }
+        await db.upload_jobs.insert_one(document)
+    except BaseException:
+        discard_spooled(*spooled)
+        raise
+    
+    _upload_job_queue.put_nowait(document["_id"])
+    return upload_job_status(document)
+
+@api_router.get("/jobs/{job_id}", response_model=UploadJobStatus)
+async def get_upload_job(job_id: str):
+    """Phase, rows processed and ETA of a background upload"""
+    document = await db.upload_jobs.find_one({"_id": job_id})
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"No upload job '{job_id}'")
+    return upload_job_status(document)
+
+@api_router.get("/events")
+async def stream_snapshot_events(aggregates: bool = False, last_event_id: Optional[str] = Header(None)):
+    """Server-sent events announcing each new snapshot; aggregates=true adds the Branch/CO metrics changed since baseSnapshotId"""
+    return StreamingResponse(
+        snapshot_events.stream(aggregates, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/clients", response_model=ClientPage)
+async def get_clients(
+    branch: Optional[str] = None,
+    co: Optional[str] = None,
+    min_overdue: Optional[float] = None,
+    max_overdue: Optional[float] = None,
+    sort: str = 'srNo',
+    order: str = Query('asc', pattern='^(asc|desc)$'),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=CLIENT_PAGE_LIMIT)
+):
+    """Page through the latest snapshot's clients with filtering and sorting"""
+    if sort not in CLIENT_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Cannot sort by '{sort}', expected one of {', '.join(CLIENT_SORT_FIELDS)}")
+    table = await get_client_table()
+    start = decode_client_cursor(cursor, table.snapshot_id, sort, order) if cursor else 0
+    
+    mask = table.select(branch, co, min_overdue, max_overdue)
+    positions, next_rank = table.page(mask, sort, order == 'desc', start, limit)
+    next_cursor = encode_client_cursor(table.snapshot_id, sort, order, next_rank) if next_rank is not None else None
+    return json_body_response(encode_client_page(int(mask.sum()), next_cursor, table.frame.iloc[positions]))
+
+# Exports stream client rows in fixed-size chunks, so memory stays flat and the
+# first rows go out before the rest are read. Snapshots stored as client rows are
+# streamed straight from a Mongo cursor walking the (snapshot_id, srNo) index
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', '5000'))
+EXPORT_MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORT_CSV_HEADER = (','.join(CLIENT_FIELDS) + '\n').encode()
+
+def encode_client_chunk(chunk: pd.DataFrame, fmt: str) -> bytes:
+    if fmt == 'csv':
+        return chunk.to_csv(index=False, header=False, lineterminator='\n').encode()
+    return b''.join(orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+                    for record in chunk.to_dict('records'))
+
+def iter_client_export(frame: pd.DataFrame, positions: np.ndarray, fmt: str,
+                       chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    if fmt == 'csv':
+        yield EXPORT_CSV_HEADER
+    for start in range(0, len(positions), chunk_rows):
+        yield encode_client_chunk(frame.iloc[positions[start:start + chunk_rows]], fmt)
+
+def client_export_query(snapshot_id: str, branch: Optional[str], co: Optional[str],
+                        min_overdue: Optional[float], max_overdue: Optional[float]) -> Dict[str, Any]:
+    """The export filters as a snapshot_clients query"""
+    query = {"snapshot_id": snapshot_id}
+    if branch is not None:
+        query["branch"] = branch
+    if co is not None:
+        query["co"] = co
+    overdue = {}
+    if min_overdue is not None:
+        overdue["$gte"] = min_overdue
+    if max_overdue is not None:
+        overdue["$lte"] = max_overdue
+    if overdue:
+        query["totalOverdue"] = overdue
+    return query
+
+# Hinting the srNo index keeps the export sort a streaming index walk, never an in-memory sort
+EXPORT_CLIENTS_INDEX = [("snapshot_id", 1), ("srNo", 1)]
+
+async def check_export_index(query: Dict[str, Any]) -> None:
+    """Fail before the response starts if the hinted index is missing, rather than mid-stream"""
+    try:
+        await db.snapshot_clients.find(query, {"_id": 1}).hint(EXPORT_CLIENTS_INDEX).limit(1).to_list(1)
+    except OperationFailure as e:
+        logger.error(f"Client export index check failed: {e}")
+        raise HTTPException(status_code=503, detail="Client export index is not available yet")
+
+async def stream_client_rows(query: Dict[str, Any], fmt: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> AsyncIterator[bytes]:
+    """Encode stored client rows chunk by chunk as the cursor delivers them"""
+    if fmt == 'csv':
+        yield EXPORT_CSV_HEADER
+    cursor = db.snapshot_clients.find(query, {"_id": 0, "snapshot_id": 0}) \
+        .sort("srNo", 1).hint(EXPORT_CLIENTS_INDEX).batch_size(chunk_rows)
+    rows = []
+    async for row in cursor:
+        rows.append(row)
+        if len(rows) == chunk_rows:
+            yield encode_client_chunk(pd.DataFrame(rows, columns=CLIENT_FIELDS), fmt)
+            rows = []
+    if rows:
+        yield encode_client_chunk(pd.DataFrame(rows, columns=CLIENT_FIELDS), fmt)
+
+# Columnar downloads are written once per snapshot and sent from a memory map
+SNAPSHOT_EXPORT_DIR = Path(os.environ.get('SNAPSHOT_EXPORT_DIR', ROOT_DIR / 'snapshot_exports'))
+SNAPSHOT_EXPORT_KEEP = int(os.environ.get('SNAPSHOT_EXPORT_KEEP', '3'))
+COLUMNAR_MEDIA_TYPES = {'arrow': 'application/vnd.apache.arrow.stream', 'parquet': 'application/vnd.apache.parquet'}
+
+class SnapshotFiles:
+    """Arrow IPC stream and Parquet renderings of snapshot tables.
+
+    Files live under one directory per snapshot; only the most recent
+    `keep` snapshot directories are kept.
+    """
+    
+    def __init__(self, directory: Path, keep: int):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+    
+    def path(self, snapshot_id: str, table: str, fmt: str) -> Path:
+        return self.directory / snapshot_id / f"{table}.{fmt}"
+    
+    def open(self, snapshot_id: str, table: str, fmt: str,
+             build: Optional[Callable[[], pa.Table]] = None) -> Optional[mmap.mmap]:
+        """Map the rendered table, building and writing it first if build is given.
+
+        Returns None when the file is not rendered and there is no build. The
+        file is mapped under the lock, so pruning cannot remove it in between.
+        """
+        path = self.path(snapshot_id, table, fmt)
+        with self._lock:
+            if not path.exists():
+                if build is None:
+                    return None
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+                data = build()
+                if fmt == 'parquet':
+                    pq.write_table(data, tmp_path, compression='zstd')
+                else:
+                    with pa.OSFile(str(tmp_path), 'wb') as sink, pa.ipc.new_stream(sink, data.schema) as writer:
+                        writer.write_table(data)
+                os.replace(tmp_path, path)
+                self._prune(snapshot_id)
+            with open(path, 'rb') as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def _prune(self, current: str) -> None:
+        snapshots = sorted((d for d in self.directory.iterdir() if d.is_dir()), key=lambda d: d.stat().st_mtime, reverse=True)
+        for directory in snapshots[self.keep:]:
+            if directory.name != current:
+                shutil.rmtree(directory, ignore_errors=True)
+
+snapshot_files = SnapshotFiles(SNAPSHOT_EXPORT_DIR, SNAPSHOT_EXPORT_KEEP)
+
+class MappedFileResponse(Response):
+    """Sends a file as views into a read-only memory map, without copying it into Python bytes"""
+    
+    chunk_size = 1024 * 1024
+    
+    def __init__(self, mapped: mmap.mmap, media_type: str, filename: str):
+        self.mapped = mapped
+        super().__init__(media_type=media_type, headers={
+            "Content-Length": str(len(self.mapped)),
+            "Content-Disposition": f'attachment; filename="{filename}"'
+        })
+    
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        view = memoryview(self.mapped)
+        try:
+            for start in range(0, len(view), self.chunk_size):
+                await send({"type": "http.response.body", "body": view[start:start + self.chunk_size], "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            view.release()
+            try:
+                self.mapped.close()
+            except BufferError:
+                pass  # a chunk is still referenced; the map closes once it is collected
+
+async def columnar_snapshot_response(snapshot_id: str, table: str, fmt: str,
+                                     load: Callable[[], Awaitable[pa.Table]]) -> Response:
+    """Send a rendered snapshot table, loading its data only when the file is missing"""
+    mapped = await asyncio.to_thread(snapshot_files.open, snapshot_id, table, fmt)
+    if mapped is None:
+        data = await load()
+        mapped = await asyncio.to_thread(snapshot_files.open, snapshot_id, table, fmt, lambda: data)
+    return MappedFileResponse(mapped, COLUMNAR_MEDIA_TYPES[fmt], f"{table}-{snapshot_id}.{fmt}")
+
+@api_router.get("/export/clients")
+async def export_clients(
+    format: str = Query('ndjson', pattern='^(ndjson|csv|arrow|parquet)$'),
+    branch: Optional[str] = None,
+    co: Optional[str] = None,
+    min_overdue: Optional[float] = None,
+    max_overdue: Optional[float] = None
+):
+    """Stream the latest snapshot's clients as NDJSON or CSV, in srNo order, or download the whole table as Arrow/Parquet"""
+    latest = await require_latest_snapshot()
+    if format in COLUMNAR_MEDIA_TYPES:
+        if any(value is not None for value in (branch, co, min_overdue, max_overdue)):
+            raise HTTPException(status_code=400, detail="Filters are only supported for ndjson and csv exports")
+        async def load() -> pa.Table:
+            return pa.Table.from_pandas(await latest_client_frame(latest), preserve_index=False)
+        return await columnar_snapshot_response(latest.snapshot_id, 'clients', format, load)
+    
+    header = await db.dashboard_data.find_one(latest.filter, projection={"layout": 1})
+    if not header:
+        raise HTTPException(status_code=404, detail="Latest snapshot is no longer stored")
+    if header.get("layout") == SNAPSHOT_LAYOUT:
+        query = client_export_query(latest.snapshot_id, branch, co, min_overdue, max_overdue)
+        await check_export_index(query)
+        body = stream_client_rows(query, format)
+    else:
+        # Blob and legacy snapshots hold the rows in one piece; only the encoding is chunked
+        frame = await latest_client_frame(latest)
+        positions = np.flatnonzero(select_clients(frame, branch, co, min_overdue, max_overdue))
+        body = iter_client_export(frame, positions, format)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="clients-{latest.snapshot_id}.{format}"'}
+    )
+
+@api_router.get("/export/metrics")
+async def export_group_metrics(view: str = 'Branch', format: str = Query('arrow', pattern='^(arrow|parquet)$')):
+    """Download the latest snapshot's Branch or CO aggregate table as Arrow/Parquet"""
+    view = resolve_view(view)
+    latest = await require_latest_snapshot()
+    table = f"{GROUP_VIEWS[view]}-metrics"
+    
+    async def load() -> pa.Table:
+        document = await load_snapshot_aggregates(latest, FULL_DASHBOARD_QUERY._replace(views=(view,)))
+        return pa.Table.from_pylist(document[f"{GROUP_VIEWS[view]}_metrics"])
+    return await columnar_snapshot_response(latest.snapshot_id, table, format, load)
+
+def _ranking_groups(table: ClientTable, view: str, key: Optional[str]) -> Tuple[OverdueRanking, List[int]]:
+    view = resolve_view(view)
+    ranking = table.overdue_rankings[view]
+    if key is None:
+        return ranking, list(range(len(ranking.keys)))
+    position = ranking.keys.get_indexer([key])[0]
+    if position < 0:
+        raise HTTPException(status_code=404, detail=f"No {view} named '{key}' in the latest snapshot")
+    return ranking, [position]
+
+@api_router.get("/top-overdue", response_model=List[TopOverdueGroup])
+async def get_top_overdue(
+    view: str = 'CO',
+    n: int = Query(50, ge=1, le=TOP_OVERDUE_MAX_N),
+    key: Optional[str] = None
+):
+    """The n clients with the highest totalOverdue in each group"""
+    table = await get_client_table()
+    ranking, groups = _ranking_groups(table, view, key)
+    return [
+        TopOverdueGroup(
+            key=ranking.keys[i],
+            overdueClients=int(ranking.counts[i]),
+            clients=frame_to_clients(table.frame.iloc[ranking.top[i][:n]])
+        )
+        for i in groups
+    ]
+
+@api_router.get("/overdue-percentiles", response_model=List[OverduePercentiles])
+async def get_overdue_percentiles(view: str = 'CO', key: Optional[str] = None):
+    """totalOverdue percentile bands of the overdue clients in each group"""
+    table = await get_client_table()
+    ranking, groups = _ranking_groups(table, view, key)
+    return [
+        OverduePercentiles(key=ranking.keys[i], overdueClients=int(ranking.counts[i]), percentiles=ranking.percentiles[i])
+        for i in groups
+    ]
+
+# Last month's join columns are stored once per last-month file (keyed by its
+# content hash), so month-over-month deltas can be rebuilt on any worker
+LAST_MONTH_FIELDS = list(dict.fromkeys(['memberId', *GROUP_VIEWS.values(), *DELTA_COLUMNS.values()]))
+
+async def store_last_month_rows(month_key: str, frame: pd.DataFrame) -> None:
+    """Write a last-month file's join columns unless a complete copy is already stored.
+
+    Row ids are derived from the key and position, so two uploads of the same
+    file writing at once (or a retry after a failure) cannot duplicate rows.
+    """
+    marker = await db.last_month_sets.find_one_and_update(
+        {"_id": month_key}, {"$set": {"storedAt": datetime.utcnow()}}, upsert=True
+    )
+    if marker and marker.get("complete"):
+        return
+    limit = asyncio.Semaphore(CLIENT_INSERT_CONCURRENCY)
+    
+    async def write(start: int):
+        async with limit:
+            rows = frame[LAST_MONTH_FIELDS].iloc[start:start + CLIENT_INSERT_BATCH].to_dict('records')
+            for position, row in enumerate(rows, start):
+                row.update(_id=f"{month_key}:{position}", month_key=month_key, position=position)
+            try:
+                await db.last_month_clients.insert_many(rows, ordered=False)
+            except BulkWriteError as e:
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+    
+    await asyncio.gather(*[write(start) for start in range(0, len(frame), CLIENT_INSERT_BATCH)])
+    await db.last_month_sets.update_one({"_id": month_key}, {"$set": {"complete": True}})
+
+async def load_last_month_rows(month_key: str) -> Optional[pd.DataFrame]:
+    """Stored join columns of a last-month file, or None if they were never stored"""
+    marker = await db.last_month_sets.find_one({"_id": month_key, "complete": True}, {"_id": 1}) if month_key else None
+    if not marker:
+        return None
+    rows = await db.last_month_clients.find(
+        {"month_key": month_key}, {"_id": 0, "month_key": 0, "position": 0}
+    ).sort("position", 1).to_list(None)
+    return pd.DataFrame(rows, columns=LAST_MONTH_FIELDS)
+
+async def load_metrics_snapshot(latest: SnapshotRef) -> MetricsSnapshot:
+    """Rebuild the aggregates of a stored snapshot on a worker that did not ingest it"""
+    header = await db.dashboard_data.find_one(
+        latest.filter, projection={"yesterday_date": 1, "today_date": 1, "last_month_key": 1}
+    )
+    if not header:
+        raise HTTPException(status_code=404, detail="Latest snapshot is no longer stored")
+    current_data = await latest_client_frame(latest)
+    last_month_key = header.get("last_month_key", '')
+    last_month_data = await load_last_month_rows(last_month_key)
+    
+    snapshot = await asyncio.to_thread(
+        MetricsSnapshot.build, current_data, last_month_data if last_month_data is not None else pd.DataFrame(columns=LAST_MONTH_FIELDS),
+        header.get("yesterday_date", ''), header.get("today_date", ''), last_month_key if last_month_data is not None else ''
+    )
+    snapshot.snapshot_id = latest.snapshot_id
+    # Snapshots stored before last month's rows were kept cannot be joined
+    if last_month_data is None:
+        snapshot.last_month_data = None
+    return snapshot
+
+async def require_metrics_snapshot() -> MetricsSnapshot:
+    """Return the aggregates of the latest snapshot"""
+    latest = await require_latest_snapshot()
+    if _metrics_snapshot is not None and _metrics_snapshot.snapshot_id == latest.snapshot_id:
+        return _metrics_snapshot
+    return await load_once("metrics_snapshot", latest.snapshot_id, lambda: cache_metrics_snapshot(latest))
+
+async def cache_metrics_snapshot(latest: SnapshotRef) -> MetricsSnapshot:
+    global _metrics_snapshot
+    _metrics_snapshot = await load_metrics_snapshot(latest)
+    return _metrics_snapshot
+
+# Recovery histograms are stored per group with each snapshot, so a worker that did
+# not ingest it answers /recovery without loading the client rows
+_recovery_histograms: Dict[Tuple[str, str], RecoveryHistogram] = {}
+
+async def store_recovery_histograms(snapshot: MetricsSnapshot) -> None:
+    histograms = await asyncio.to_thread(lambda: {view: snapshot.recovery_histogram(view) for view in GROUP_VIEWS})
+    rows = [
+        {"snapshot_id": snapshot.snapshot_id, "view": view, "position": position, **row}
+        for view, histogram in histograms.items() for position, row in enumerate(histogram.rows())
+    ]
+    await db.snapshot_histograms.insert_many(rows, ordered=False)
+
+async def require_recovery_histogram(view: str) -> RecoveryHistogram:
+    """Recovery histogram of the latest snapshot for a view"""
+    latest = await require_latest_snapshot()
+    if _metrics_snapshot is not None and _metrics_snapshot.snapshot_id == latest.snapshot_id:
+        return await asyncio.to_thread(_metrics_snapshot.recovery_histogram, view)
+    histogram = _recovery_histograms.get((latest.snapshot_id, view))
+    if histogram is None:
+        histogram = await load_once(f"recovery_histogram/{view}", latest.snapshot_id,
+                                    lambda: load_recovery_histogram(latest, view))
+    return histogram
+
+async def load_recovery_histogram(latest: SnapshotRef, view: str) -> RecoveryHistogram:
+    rows = await db.snapshot_histograms.find(
+        {"snapshot_id": latest.snapshot_id, "view": view}, {"_id": 0, "key": 1, "days": 1, "counts": 1, "amounts": 1}
+    ).sort("position", 1).to_list(None)
+    if not rows:
+        # Snapshots stored before histograms were kept
+        snapshot = await require_metrics_snapshot()
+        return await asyncio.to_thread(snapshot.recovery_histogram, view)
+    histogram = await asyncio.to_thread(RecoveryHistogram.from_rows, rows)
+    for key in [key for key in _recovery_histograms if key[0] != latest.snapshot_id]:
+        del _recovery_histograms[key]
+    _recovery_histograms[(latest.snapshot_id, view)] = histogram
+    return histogram
+
+def require_month_over_month(snapshot: MetricsSnapshot) -> MonthOverMonthJoin:
+    if snapshot.last_month_data is None:
+        raise HTTPException(status_code=404, detail="Last month's data is not available for this snapshot; upload the files again")
+    return snapshot.month_over_month()
+
+@api_router.get("/recovery", response_model=RecoveryWindowData)
+async def get_recovery_window(
+    from_date: str = Query(..., alias='from'),
+    to_date: str = Query(..., alias='to'),
+    view: str = 'Branch'
+):
+    """Recovered clients and amounts per group for any lastInstallDate window"""
+    view = resolve_view(view)
+    first_day, last_day = parse_day_ordinal(from_date), parse_day_ordinal(to_date)
+    if first_day > last_day:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    
+    histogram = await require_recovery_histogram(view)
+    counts, amounts = histogram.window(first_day, last_day)
+    return RecoveryWindowData(
+        view=view,
+        fromDate=from_date,
+        toDate=to_date,
+        totalRecoveredClients=int(counts.sum()),
+        totalRecoveredAmount=float(amounts.sum()),
+        groups=[
+            RecoveryWindowMetrics(key=key, recoveredClients=count, recoveredAmount=amount)
+            for key, count, amount in zip(histogram.keys, counts.tolist(), amounts.tolist())
+        ]
+    )
+
+@api_router.get("/history/metrics", response_model=List[SnapshotMetricsHistory])
+async def get_metrics_history(
+    view: str = 'Branch',
+    keys: Optional[str] = None,
+    from_date: Optional[str] = Query(None, alias='from'),
+    to_date: Optional[str] = Query(None, alias='to'),
+    engine: str = Query('mongo', pattern='^(mongo|python)$')
+):
+    """Per-group metrics of every stored upload in a date range, oldest first.
+
+    engine=mongo aggregates the stored client rows inside Mongo; engine=python
+    loads them and runs the dashboard engine. Both cover the same snapshots
+    and agree to the cent.
+    """
+    view = resolve_view(view)
+    
+    # Snapshots stored before the date filters were recorded cannot be recomputed
+    match = {"yesterday_date": {"$exists": True}}
+    window = {}
+    if from_date:
+        window["$gte"] = datetime(1970, 1, 1) + timedelta(days=parse_day_ordinal(from_date))
+    if to_date:
+        window["$lt"] = datetime(1970, 1, 1) + timedelta(days=parse_day_ordinal(to_date) + 1)
+    if window:
+        match["timestamp"] = window
+    headers = await db.dashboard_data.find(
+        match, {"snapshot_id": 1, "timestamp": 1, "yesterday_date": 1, "today_date": 1, "layout": 1, "clients_pruned": 1}
+    ).sort("timestamp", 1).to_list(None)
+    
+    limit = asyncio.Semaphore(HISTORY_QUERY_CONCURRENCY)
+    async def recompute(header: Dict[str, Any]) -> SnapshotMetricsHistory:
+        async with limit:
+            return await snapshot_group_metrics(header, view, parse_list_param(keys), engine)
+    return await asyncio.gather(*[recompute(header) for header in headers])
+
+@api_router.get("/trends", response_model=List[TrendPoint])
+async def get_trends(
+    key: str,
+    view: str = 'Branch',
+    from_date: Optional[str] = Query(None, alias='from'),
+    to_date: Optional[str] = Query(None, alias='to'),
+    bucket: str = Query('day', pattern='^(day|week|month)$')
+):
+    """One group's daily metrics over time, optionally downsampled to week or month"""
+    view = resolve_view(view)
+    
+    match = {"view": view, "key": key}
+    window = {}
+    if from_date:
+        window["$gte"] = datetime(1970, 1, 1) + timedelta(days=parse_day_ordinal(from_date))
+    if to_date:
+        window["$lte"] = datetime(1970, 1, 1) + timedelta(days=parse_day_ordinal(to_date))
+    if window:
+        match["date"] = window
+    rows = await db.metric_trends.find(
+        match, {"_id": 0, "date": 1, **{field: 1 for field in TREND_FIELDS}}
+    ).sort("date", 1).to_list(None)
+    
+    if bucket != 'day':
+        rows = downsample_trend(rows, bucket)
+    return [TrendPoint(key=key, **{**row, "date": row["date"].date().isoformat()}) for row in rows]
+
+@api_router.get("/deltas", response_model=List[GroupDelta])
+async def get_group_deltas(view: str = 'Branch'):
+    """Month-over-month deltas and roll rates per group, joined by memberId"""
+    view = resolve_view(view)
+    snapshot = await require_metrics_snapshot()
+    join = await asyncio.to_thread(require_month_over_month, snapshot)
+    return join.group_deltas(view, snapshot.keys[view])
+
+@api_router.get("/client-deltas", response_model=ClientDeltaPage)
+async def get_client_deltas(
+    view: str = 'Branch',
+    key: Optional[str] = None,
+    status: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Per-client month-over-month deltas, optionally for one group and status"""
+    view = resolve_view(view)
+    snapshot = await require_metrics_snapshot()
+    if status is not None and status not in CLIENT_DELTA_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status '{status}', expected one of {', '.join(CLIENT_DELTA_STATUSES)}")
+    join = await asyncio.to_thread(require_month_over_month, snapshot)
+    
+    selected = np.ones(len(join.current_data), dtype=bool)
+    if key is not None:
+        selected &= (join.current_data[GROUP_VIEWS[view]] == key).to_numpy()
+    if status is not None:
+        selected &= join.status == status
+    positions = np.flatnonzero(selected)
+    
+    return ClientDeltaPage(
+        total=len(positions),
+        offset=offset,
+        limit=limit,
+        clients=join.client_deltas(positions[offset:offset + limit])
+    )
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(UploadSizeLimitMiddleware, max_file_bytes=MAX_UPLOAD_BYTES, files=len(UPLOAD_FIELDS), paths=UPLOAD_PATHS)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -376,6 +2922,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.error(f"Could not create indexes: {e}")
+    run_in_background(prune_snapshots(), "Snapshot retention")
+
+@app.on_event("startup")
+async def start_upload_job_workers():
+    global _upload_job_queue
+    _upload_job_queue = asyncio.Queue()
+    _upload_job_tasks.extend(asyncio.create_task(upload_job_worker()) for _ in range(UPLOAD_JOB_WORKERS))
+    _upload_job_tasks.append(asyncio.create_task(upload_job_heartbeat()))
+
+@app.on_event("shutdown")
+async def stop_upload_job_workers():
+    for task in _upload_job_tasks:
+        task.cancel()
+    _upload_job_tasks.clear()
+
+@app.on_event("startup")
+async def start_snapshot_events():
+    global _snapshot_events_task
+    _snapshot_events_task = asyncio.create_task(snapshot_events.run())
+
+@app.on_event("shutdown")
+async def stop_snapshot_events():
+    if _snapshot_events_task is not None:
+        _snapshot_events_task.cancel()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+
+@app.on_event("shutdown")
+async def shutdown_parse_executor():
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
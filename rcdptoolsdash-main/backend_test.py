@@ -12,6 +12,7 @@ import io
 from datetime import datetime, timedelta
 import tempfile
 import sys
+import time
 
 # Get backend URL from environment
 BACKEND_URL = "https://stardust-metrics.preview.emergentagent.com/api"
@@ -340,6 +341,149 @@ class DashboardAPITester:
             self.log_test("Branch vs CO Metrics", "FAIL", f"Exception during validation: {str(e)}")
             return False
     
+    def test_recovery_window(self):
+        """Test recovery queries over an arbitrary date window"""
+        try:
+            response = self.session.get(f"{self.backend_url}/recovery",
+                                        params={'from': '01-Jan-24', 'to': '2024-01-31', 'view': 'Branch'})
+            
+            if response.status_code != 200:
+                self.log_test("Recovery Window", "FAIL", f"Unexpected status {response.status_code}")
+                return False
+            
+            result_data = response.json()
+            groups = result_data.get('groups', [])
+            if result_data.get('totalRecoveredClients') != sum(g['recoveredClients'] for g in groups):
+                self.log_test("Recovery Window", "FAIL", "Total recovered clients does not match group sum")
+                return False
+            
+            invalid = self.session.get(f"{self.backend_url}/recovery", params={'from': 'yesterday', 'to': '31-Jan-24'})
+            if invalid.status_code != 400:
+                self.log_test("Recovery Window", "FAIL", f"Invalid date should return 400, got {invalid.status_code}")
+                return False
+            
+            self.log_test("Recovery Window", "PASS", "Recovery window query returned consistent totals",
+                          {"group_count": len(groups), "total_recovered": result_data['totalRecoveredAmount']})
+            return True
+            
+        except Exception as e:
+            self.log_test("Recovery Window", "FAIL", f"Exception during test: {str(e)}")
+            return False
+    
+    def test_dashboard_conditional_get(self):
+        """Test ETag revalidation and compressed dashboard bodies"""
+        try:
+            response = self.session.get(f"{self.backend_url}/dashboard-data", headers={'Accept-Encoding': 'gzip'})
+            etag = response.headers.get('ETag')
+            
+            if response.status_code != 200 or not etag:
+                self.log_test("Dashboard Conditional GET", "FAIL", f"Expected 200 with an ETag, got {response.status_code}")
+                return False
+            
+            if response.headers.get('Content-Encoding') not in ('gzip', 'br'):
+                self.log_test("Dashboard Conditional GET", "FAIL", "Dashboard body was not compressed")
+                return False
+            
+            revalidated = self.session.get(f"{self.backend_url}/dashboard-data", headers={'If-None-Match': etag})
+            if revalidated.status_code != 304:
+                self.log_test("Dashboard Conditional GET", "FAIL", f"Matching ETag should return 304, got {revalidated.status_code}")
+                return False
+            
+            self.log_test("Dashboard Conditional GET", "PASS", "Unchanged snapshot revalidated with 304",
+                          {"etag": etag, "encoding": response.headers.get('Content-Encoding')})
+            return True
+            
+        except Exception as e:
+            self.log_test("Dashboard Conditional GET", "FAIL", f"Exception during test: {str(e)}")
+            return False
+    
+    def test_metrics_history(self):
+        """Test that the Mongo pipeline reproduces the Python metrics engine"""
+        try:
+            results = {}
+            for engine in ('mongo', 'python'):
+                response = self.session.get(f"{self.backend_url}/history/metrics", params={'view': 'Branch', 'engine': engine})
+                if response.status_code != 200:
+                    self.log_test("Metrics History", "FAIL", f"engine={engine} returned {response.status_code}")
+                    return False
+                results[engine] = response.json()
+            
+            if results['mongo'] != results['python']:
+                self.log_test("Metrics History", "FAIL", "Mongo pipeline and Python engine disagree")
+                return False
+            
+            self.log_test("Metrics History", "PASS", "Both engines agree on every stored upload",
+                          {"snapshots": len(results['mongo'])})
+            return True
+            
+        except Exception as e:
+            self.log_test("Metrics History", "FAIL", f"Exception during test: {str(e)}")
+            return False
+    
+    def test_trends(self):
+        """Test the per-group trend series written at upload"""
+        try:
+            dashboard = self.session.get(f"{self.backend_url}/dashboard-data").json()
+            latest = dashboard['branchMetrics'][0]
+            response = self.session.get(f"{self.backend_url}/trends", params={'view': 'Branch', 'key': latest['key']})
+            
+            if response.status_code != 200 or not response.json():
+                self.log_test("Trends", "FAIL", f"Expected trend points, got {response.status_code}")
+                return False
+            
+            point = response.json()[-1]
+            if point['recoveryPercentage'] != latest['recoveryPercentage']:
+                self.log_test("Trends", "FAIL", "Latest trend point does not match the dashboard")
+                return False
+            
+            self.log_test("Trends", "PASS", "Latest trend point matches the dashboard",
+                          {"points": len(response.json()), "date": point['date']})
+            return True
+            
+        except Exception as e:
+            self.log_test("Trends", "FAIL", f"Exception during test: {str(e)}")
+            return False
+    
+    def test_upload_job(self):
+        """Test background upload jobs and their progress reporting"""
+        try:
+            current_file_path = self.create_test_excel_file("current_month.xlsx", "current")
+            last_month_file_path = self.create_test_excel_file("last_month.xlsx", "last_month")
+            
+            with open(current_file_path, 'rb') as current_file, open(last_month_file_path, 'rb') as last_month_file:
+                files = {
+                    'current_month_file': ('current_month.xlsx', current_file),
+                    'last_month_file': ('last_month.xlsx', last_month_file)
+                }
+                response = self.session.post(f"{self.backend_url}/upload-jobs", files=files,
+                                             params={'yesterday_date': '17-Jan-24', 'today_date': '18-Jan-24'})
+            
+            os.unlink(current_file_path)
+            os.unlink(last_month_file_path)
+            
+            if response.status_code != 202:
+                self.log_test("Upload Job", "FAIL", f"Expected 202, got {response.status_code}")
+                return False
+            
+            job = response.json()
+            for _ in range(60):
+                if job['phase'] in ('done', 'failed'):
+                    break
+                time.sleep(1)
+                job = self.session.get(f"{self.backend_url}/jobs/{job['jobId']}").json()
+            
+            if job['phase'] != 'done' or not job.get('snapshotId'):
+                self.log_test("Upload Job", "FAIL", f"Job ended in phase {job['phase']}: {job.get('error')}")
+                return False
+            
+            self.log_test("Upload Job", "PASS", "Background upload finished and stored a snapshot",
+                          {"rows_processed": job['rowsProcessed'], "snapshot_id": job['snapshotId']})
+            return True
+            
+        except Exception as e:
+            self.log_test("Upload Job", "FAIL", f"Exception during test: {str(e)}")
+            return False
+    
     def run_all_tests(self):
         """Run all backend tests"""
         print("🚀 Starting 3D Dashboard Backend API Tests")
@@ -351,6 +495,11 @@ class DashboardAPITester:
             self.test_dashboard_data_retrieval,
             self.test_metrics_calculation_accuracy,
             self.test_branch_vs_co_metrics,
+            self.test_recovery_window,
+            self.test_dashboard_conditional_get,
+            self.test_upload_job,
+            self.test_metrics_history,
+            self.test_trends,
             self.test_excel_upload_invalid_files,
             self.test_excel_upload_missing_files
         ]
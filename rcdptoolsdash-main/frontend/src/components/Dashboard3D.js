@@ -23,6 +23,13 @@ const Dashboard3D = () => {
     loadExistingData();
   }, []);
 
+  // Reload when the server announces a new snapshot instead of polling
+  useEffect(() => {
+    const events = new EventSource(`${API}/events`);
+    events.addEventListener('snapshot', () => loadExistingData());
+    return () => events.close();
+  }, []);
+
   const loadExistingData = async () => {
     try {
       const response = await axios.get(`${API}/dashboard-data`);
@@ -48,13 +55,24 @@ const Dashboard3D = () => {
     formData.append('today_date', dates.today || '');
 
     try {
-      const response = await axios.post(`${API}/upload-excel`, formData, {
+      // Large uploads run as a background job so they outlive proxy timeouts
+      const response = await axios.post(`${API}/upload-jobs`, formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
         },
       });
 
-      setDashboardData(response.data);
+      let job = response.data;
+      while (!['done', 'failed'].includes(job.phase)) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        job = (await axios.get(`${API}/jobs/${job.jobId}`)).data;
+      }
+      if (job.phase === 'failed') {
+        setError(job.error || 'Error processing files');
+        return;
+      }
+
+      await loadExistingData();
       setShowUploadModal(false);
     } catch (error) {
       console.error('Error uploading files:', error);
@@ -1,10 +1,18 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
+import axios from 'axios';
 import './ExpandedCardModal.css';
 
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 200;
+
 const ExpandedCardModal = ({ data, viewType, onClose }) => {
   const [activeTab, setActiveTab] = useState('overview');
   const [sortBy, setSortBy] = useState('name');
   const [sortOrder, setSortOrder] = useState('asc');
+  const [clients, setClients] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingClients, setLoadingClients] = useState(false);
 
   const formatCurrency = (amount) => {
     return new Intl.NumberFormat('en-IN', {
@@ -22,55 +30,52 @@ const ExpandedCardModal = ({ data, viewType, onClose }) => {
     return { class: 'poor', text: 'Poor' };
   };
 
-  const sortedClients = [...data.clients].sort((a, b) => {
-    let valueA = a[sortBy];
-    let valueB = b[sortBy];
-    
-    if (typeof valueA === 'string') {
-      valueA = valueA.toLowerCase();
-      valueB = valueB.toLowerCase();
+  // Clients are paged, filtered and sorted by the server
+  const fetchClientPage = async (cursor) => {
+    const params = {
+      [viewType === 'Branch' ? 'branch' : 'co']: data.key,
+      sort: sortBy,
+      order: sortOrder,
+      limit: PAGE_SIZE
+    };
+    if (cursor) {
+      params.cursor = cursor;
     }
-    
-    if (sortOrder === 'asc') {
-      return valueA > valueB ? 1 : -1;
-    } else {
-      return valueA < valueB ? 1 : -1;
+    const response = await axios.get(`${API}/clients`, { params });
+    return response.data;
+  };
+
+  const loadClients = async (cursor = null) => {
+    setLoadingClients(true);
+    try {
+      const page = await fetchClientPage(cursor);
+      setClients(prev => (cursor ? [...prev, ...page.clients] : page.clients));
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Error loading clients:', error);
+    } finally {
+      setLoadingClients(false);
     }
-  });
+  };
 
-  const exportToExcel = () => {
-    // Create CSV content for Excel export
-    const headers = [
-      'Sr No', 'Member ID', 'Name', 'CO', 'Branch', 
-      'Due Total', 'Current Rec Total', 'Total Overdue', 
-      'Current Advance', 'Opening Advance', 'OLP', 'Cell No'
-    ];
-    
-    const csvContent = [
-      headers.join(','),
-      ...sortedClients.map(client => [
-        client.srNo,
-        client.memberId,
-        `"${client.name}"`,
-        `"${client.co}"`,
-        `"${client.branch}"`,
-        client.dueTotal,
-        client.currentRecTotal,
-        client.totalOverdue,
-        client.currentAdvance,
-        client.openingAdvance,
-        client.olp,
-        `"${client.cellNo}"`
-      ].join(','))
-    ].join('\n');
+  useEffect(() => {
+    if (activeTab === 'clients') {
+      loadClients();
+    }
+  }, [activeTab, sortBy, sortOrder, data.key, viewType]);
+
+  const sortedClients = clients;
 
-    const blob = new Blob([csvContent], { type: 'text/csv' });
-    const url = window.URL.createObjectURL(blob);
+  // The server streams the CSV, so large groups download without paging
+  const exportToExcel = () => {
+    const params = new URLSearchParams({
+      format: 'csv',
+      [viewType === 'Branch' ? 'branch' : 'co']: data.key
+    });
     const a = document.createElement('a');
-    a.href = url;
+    a.href = `${API}/export/clients?${params}`;
     a.download = `${data.key}_client_details.csv`;
     a.click();
-    window.URL.revokeObjectURL(url);
   };
 
   const recoveryStatus = getRecoveryStatus(data.recoveryPercentage);
@@ -106,7 +111,7 @@ const ExpandedCardModal = ({ data, viewType, onClose }) => {
             className={`tab-btn ${activeTab === 'clients' ? 'active' : ''}`}
             onClick={() => setActiveTab('clients')}
           >
-            Client Details ({data.clients.length})
+            Client Details ({data.activeCount})
           </button>
           <button 
             className={`tab-btn ${activeTab === 'analytics' ? 'active' : ''}`}
@@ -237,6 +242,15 @@ const ExpandedCardModal = ({ data, viewType, onClose }) => {
                     ))}
                   </tbody>
                 </table>
+                {nextCursor && (
+                  <button
+                    className="export-btn"
+                    disabled={loadingClients}
+                    onClick={() => loadClients(nextCursor)}
+                  >
+                    {loadingClients ? 'Loading...' : 'Load more'}
+                  </button>
+                )}
               </div>
             </div>
           )}
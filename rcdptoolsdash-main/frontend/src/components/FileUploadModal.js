@@ -36,7 +36,10 @@ const FileUploadModal = ({ onUpload, onClose, loading }) => {
     return useDropzone({
       accept: {
         'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx'],
-        'application/vnd.ms-excel': ['.xls']
+        'application/vnd.ms-excel': ['.xls'],
+        'text/csv': ['.csv'],
+        'application/vnd.apache.parquet': ['.parquet'],
+        'application/vnd.apache.arrow.file': ['.arrow', '.feather', '.ipc']
       },
       multiple: false,
       onDrop: (acceptedFiles) => {
@@ -0,0 +1,86 @@
+"""Offline checks of the server-sent snapshot event hub."""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import orjson
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'backend'))
+
+import server
+
+
+def aggregates(**branches):
+    return {"Branch": [{"key": key, "activeCount": count} for key, count in branches.items()], "CO": []}
+
+
+async def next_event(stream):
+    frame = await stream.__anext__()
+    while frame.startswith((b"retry:", b":")):
+        frame = await stream.__anext__()
+    return orjson.loads(frame.split(b"\ndata: ", 1)[1])
+
+
+def test_subscriber_in_step_gets_diffs():
+    async def run():
+        hub = server.SnapshotEventHub()
+        stream = hub.stream(True, None)
+        await stream.__anext__()
+        hub.publish("s1", {}, aggregates(A=1, B=1))
+        first = await next_event(stream)
+        assert first["baseSnapshotId"] is None and len(first["changed"]["Branch"]) == 2
+
+        hub.publish("s2", {}, aggregates(A=2))
+        event = await next_event(stream)
+        assert event["baseSnapshotId"] == "s1"
+        assert event["changed"]["Branch"] == [{"key": "A", "activeCount": 2}]
+        assert event["removed"]["Branch"] == ["B"]
+        await stream.aclose()
+
+    asyncio.run(run())
+
+
+def test_coalesced_subscriber_gets_full_aggregates():
+    async def run():
+        hub = server.SnapshotEventHub()
+        stream = hub.stream(True, None)
+        await stream.__anext__()
+        hub.publish("s1", {}, aggregates(A=1, B=1, C=1))
+        await next_event(stream)
+
+        # s2 changes A and drops C, s3 only changes B; the subscriber wakes up after both
+        hub.publish("s2", {}, aggregates(A=2, B=1))
+        hub.publish("s3", {}, aggregates(A=2, B=3))
+        event = await next_event(stream)
+        assert event["snapshotId"] == "s3" and event["baseSnapshotId"] is None
+        assert event["changed"]["Branch"] == aggregates(A=2, B=3)["Branch"]
+        assert event["removed"]["Branch"] == []
+        await stream.aclose()
+
+    asyncio.run(run())
+
+
+def test_late_subscriber_gets_full_aggregates():
+    async def run():
+        hub = server.SnapshotEventHub()
+        hub.publish("s1", {}, aggregates(A=1))
+        hub.publish("s2", {}, aggregates(A=1, B=2))
+
+        fresh = hub.stream(True, None)
+        event = await next_event(fresh)
+        assert event["baseSnapshotId"] is None and len(event["changed"]["Branch"]) == 2
+
+        # A reconnect that names the base snapshot can take the diff
+        resumed = hub.stream(True, "s1")
+        event = await next_event(resumed)
+        assert event["baseSnapshotId"] == "s1" and event["changed"]["Branch"] == [{"key": "B", "activeCount": 2}]
+
+        compact = hub.stream(False, None)
+        assert await next_event(compact) == {"snapshotId": "s2"}
+        for stream in (fresh, resumed, compact):
+            await stream.aclose()
+
+    asyncio.run(run())
@@ -0,0 +1,357 @@
+"""Offline checks of the pandas metric engine and the upload readers.
+
+Run with `pytest tests` from the project root; no Mongo server is needed.
+"""
+import csv
+import math
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'backend'))
+
+import server
+
+YESTERDAY, TODAY = '17-Jan-24', '18-Jan-24'
+DATES = [YESTERDAY, TODAY, '10-Jan-24', '20-Dec-23', '']
+
+
+def client_frame(rng: np.random.Generator, n: int, first_id: int = 0, branches: int = 4) -> pd.DataFrame:
+    """n clients with unique memberIds, spread over a few branches and COs"""
+    amounts = lambda: rng.choice([0.0, 1.0, 2.0, 3.5, 150.0, 1200.25], n)
+    return pd.DataFrame({
+        'srNo': np.arange(1, n + 1),
+        'memberId': [f"M{first_id + i:05d}" for i in range(n)],
+        'name': [f"Client {first_id + i}" for i in range(n)],
+        'branch': rng.choice([f"Branch {i}" for i in range(branches)], n),
+        'co': rng.choice([f"CO {i}" for i in range(2 * branches)], n),
+        'dueTotal': amounts(),
+        'currentRecTotal': amounts(),
+        'totalOverdue': amounts(),
+        'currentAdvance': amounts(),
+        'openingAdvance': amounts(),
+        'disbDate': rng.choice(DATES, n),
+        'lastInstallDate': rng.choice(DATES, n),
+        'olp': amounts(),
+        'cellNo': '',
+    })[server.CLIENT_FIELDS]
+
+
+def assert_same_metrics(updated: server.MetricsSnapshot, rebuilt: server.MetricsSnapshot):
+    got, want = updated.metrics(), rebuilt.metrics()
+    for view in server.GROUP_VIEWS:
+        assert list(got[view]) == list(want[view]), view
+        for key, metrics in want[view].items():
+            for field, value in metrics.model_dump().items():
+                other = got[view][key].model_dump()[field]
+                if isinstance(value, float):
+                    assert math.isclose(other, value, rel_tol=1e-9, abs_tol=1e-6), (view, key, field)
+                else:
+                    assert other == value, (view, key, field)
+
+
+def changed(frame, rng):
+    frame = frame.copy()
+    rows = rng.choice(len(frame), 10, replace=False)
+    frame.loc[rows, 'currentRecTotal'] += 7.0
+    frame.loc[rows[:5], 'lastInstallDate'] = TODAY
+    frame.loc[rows[5:], 'co'] = 'CO 0'
+    return frame
+
+
+def added(frame, rng):
+    return pd.concat([frame, client_frame(rng, 15, first_id=len(frame), branches=6)], ignore_index=True)
+
+
+def added_duplicate(frame, rng):
+    return pd.concat([changed(frame, rng), frame.iloc[:3]], ignore_index=True)
+
+
+def truncated(frame, rng):
+    return changed(frame, rng).iloc[:-12]
+
+
+def moved_group(frame, rng):
+    frame = frame.copy()
+    frame.loc[frame['branch'] == 'Branch 0', 'branch'] = 'Branch 1'
+    frame.loc[frame['co'] == 'CO 2', 'co'] = 'CO 9'
+    return frame
+
+
+def removed(frame, rng):
+    return frame.drop(index=rng.choice(len(frame), 12, replace=False)).reset_index(drop=True)
+
+
+def reordered(frame, rng):
+    return frame.iloc[rng.permutation(len(frame))].reset_index(drop=True)
+
+
+def vanished_group(frame, rng):
+    return frame[frame['branch'] != 'Branch 0'].reset_index(drop=True)
+
+
+def build(frame, last_month):
+    return server.MetricsSnapshot.build(frame, last_month, YESTERDAY, TODAY, 'last-month')
+
+
+@pytest.mark.parametrize('edits', [[changed], [added], [added_duplicate], [truncated], [moved_group],
+                                   [changed, moved_group, added, truncated]])
+def test_incremental_update_matches_full_build(edits, monkeypatch):
+    # Moving whole groups touches more rows than the default ratio allows
+    monkeypatch.setattr(server, 'INCREMENTAL_MAX_CHANGE_RATIO', 2.0)
+    rng = np.random.default_rng(8)
+    current, last_month = client_frame(rng, 200), client_frame(rng, 150)
+    snapshot = build(current, last_month)
+
+    # Chained updates start from the group codes of the previous update
+    for edit in edits:
+        current = edit(current, rng)
+        snapshot = snapshot.update(current, YESTERDAY, TODAY, 'last-month')
+        assert snapshot is not None
+        assert_same_metrics(snapshot, build(current, last_month))
+
+
+@pytest.mark.parametrize('edit', [removed, reordered, vanished_group])
+def test_rows_out_of_line_are_rebuilt(edit, monkeypatch):
+    rng = np.random.default_rng(8)
+    current, last_month = client_frame(rng, 200), client_frame(rng, 150)
+    snapshot = build(current, last_month)
+
+    new_current = edit(current, rng)
+    assert snapshot.update(new_current, YESTERDAY, TODAY, 'last-month') is None
+    monkeypatch.setattr(server, '_metrics_snapshot', snapshot)
+    updated = server.update_metrics_snapshot(new_current, last_month, YESTERDAY, TODAY, 'last-month')
+    assert_same_metrics(updated, build(new_current, last_month))
+
+
+def test_update_falls_back_on_new_dates_or_last_month():
+    rng = np.random.default_rng(8)
+    current, last_month = client_frame(rng, 50), client_frame(rng, 50)
+    snapshot = build(current, last_month)
+
+    assert snapshot.update(current, TODAY, '19-Jan-24', 'last-month') is None
+    assert snapshot.update(current, YESTERDAY, TODAY, 'other-month') is None
+    assert snapshot.update(current, YESTERDAY, TODAY, '') is None
+
+
+def evaluate(expression, row):
+    """The subset of Mongo aggregation expressions metrics_pipeline emits"""
+    if isinstance(expression, str) and expression.startswith('$'):
+        return row[expression[1:]]
+    if not isinstance(expression, dict):
+        return expression
+    (op, args), = expression.items()
+    if op == '$and':
+        return all(evaluate(arg, row) for arg in args)
+    if op == '$cond':
+        return evaluate(args[1] if evaluate(args[0], row) else args[2], row)
+    left, right = evaluate(args[0], row), evaluate(args[1], row)
+    return {'$gt': left > right, '$lte': left <= right, '$eq': left == right}[op]
+
+
+def run_pipeline(pipeline, rows):
+    """Run a $match/$group pipeline with compensated sums, like Mongo's $sum"""
+    (match,), (group,) = [stage.values() for stage in pipeline]
+    selected = [row for row in rows if all(
+        row[field] in condition['$in'] if isinstance(condition, dict) else row[field] == condition
+        for field, condition in match.items()
+    )]
+    groups = {}
+    for row in selected:
+        groups.setdefault(evaluate(group['_id'], row), []).append(row)
+    sums = np.array([[math.fsum(evaluate(group[field]['$sum'], row) for row in members) for members in groups.values()]
+                     for field in server.CONTRIBUTION_FIELDS]).reshape(len(server.CONTRIBUTION_FIELDS), len(groups))
+    return list(groups), sums
+
+
+@pytest.mark.parametrize('day', [(YESTERDAY, TODAY), ('10-Jan-24', '11-Jan-24')])
+def test_rule_expressions_match_rule_masks(day):
+    frame = client_frame(np.random.default_rng(24), 300)
+    rows = frame.to_dict('records')
+    for _, _, conditions in server.METRIC_RULES:
+        expression = server.rule_expression(conditions, *day)
+        assert [evaluate(expression, row) for row in rows] == list(server.rule_mask(frame, conditions, *day))
+
+
+@pytest.mark.parametrize('keys', [None, ['Branch 1', 'Branch 3']])
+def test_mongo_pipeline_matches_python_engine(keys):
+    rng = np.random.default_rng(24)
+    frame = client_frame(rng, 5000)
+    # Fractional amounts, where naive and compensated sums differ in the last bits
+    for column in ('dueTotal', 'currentRecTotal', 'totalOverdue', 'currentAdvance', 'openingAdvance', 'olp'):
+        frame[column] = np.round(rng.uniform(0, 50000, len(frame)), 2)
+    rows = [dict(row, snapshot_id='s1') for row in frame.to_dict('records')]
+    rows += [dict(row, snapshot_id='s0') for row in rows[:100]]
+
+    groups, mongo_sums = run_pipeline(server.metrics_pipeline('s1', 'Branch', YESTERDAY, TODAY, keys), rows)
+    codes, keys_in_order = pd.factorize(frame['branch'], sort=False)
+    python_sums = server.reduce_by_group(codes, len(keys_in_order), server.build_contributions(frame, YESTERDAY, TODAY))
+    python_sums = python_sums[:, keys_in_order.get_indexer(groups)]
+
+    assert sorted(groups) == sorted(keys or keys_in_order)
+    np.testing.assert_allclose(mongo_sums, python_sums, rtol=1e-12)
+    np.testing.assert_array_equal(server.round_amounts(mongo_sums), server.round_amounts(python_sums))
+
+
+def clients(*rows) -> pd.DataFrame:
+    """Client frame from (memberId, branch, totalOverdue) tuples"""
+    frame = client_frame(np.random.default_rng(0), len(rows))
+    frame['memberId'] = [member_id for member_id, _, _ in rows]
+    frame['branch'] = [branch for _, branch, _ in rows]
+    frame['totalOverdue'] = [float(overdue) for _, _, overdue in rows]
+    return frame
+
+
+def group_deltas(current, last_month):
+    join = server.MonthOverMonthJoin(current, last_month)
+    keys = pd.Index(pd.unique(pd.concat([current['branch'], last_month['branch']])))
+    return {delta.key: delta for delta in join.group_deltas('Branch', keys)}
+
+
+def test_month_over_month_join_counts_repeated_last_month_ids_once():
+    current = clients(('A', 'North', 10), ('B', 'North', 0), ('C', 'South', 8))
+    last_month = clients(('A', 'North', 4), ('A', 'South', 9), ('B', 'North', 6), ('D', 'South', 1), ('D', 'North', 1))
+    deltas = group_deltas(current, last_month)
+
+    assert (deltas['North'].matchedClients, deltas['North'].newClients, deltas['North'].lostClients) == (2, 0, 0)
+    assert (deltas['South'].matchedClients, deltas['South'].newClients, deltas['South'].lostClients) == (0, 1, 1)
+    # A joins its first last-month row, so it rolled (4 -> 10) and B was cured (6 -> 0)
+    assert deltas['North'].rolledClients == 1 and deltas['North'].curedClients == 1
+    assert deltas['North'].overdueDelta == (10 - 4) + (0 - 6)
+
+
+def test_month_over_month_join_all_new_and_all_lost():
+    current = clients(('A', 'North', 10), ('B', 'South', 0))
+    last_month = clients(('X', 'North', 7), ('Y', 'South', 3), ('Y', 'South', 3))
+
+    deltas = group_deltas(current, last_month)
+    assert [(d.newClients, d.matchedClients, d.lostClients) for d in deltas.values()] == [(1, 0, 1), (1, 0, 1)]
+    assert deltas['North'].overdueDelta == 10
+
+    join = server.MonthOverMonthJoin(current, last_month)
+    assert list(join.status) == ['new', 'new']
+    assert list(join.lost_rows['memberId']) == ['X', 'Y']
+
+
+def write_workbook(path: Path, rows: int):
+    """A workbook laid out like the branch export: a header, two banner rows, then clients"""
+    width = server.EXCEL_USED_COLUMNS[-1] + 1
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append([f"Column {i}" for i in range(width)])
+    sheet.append(['Branch export'] + [None] * (width - 1))
+    sheet.append([None] * width)
+    for i in range(rows):
+        row = [None] * width
+        row[1] = 100000 + i if i % 3 else f"M{i:05d}"
+        row[2] = f"Client {i}"
+        row[4] = None if i % 17 == 5 else f"Branch {i % 4}"
+        row[5] = f"CO {i % 6}"
+        row[10] = i * 1.5
+        row[14] = str(i % 9) if i % 2 else i % 9
+        row[17] = None if i % 5 == 0 else 10.0
+        row[18] = 'n/a' if i % 11 == 0 else i % 3
+        row[21] = 25.75
+        row[23] = datetime(2023, 12, 1 + i % 28)
+        row[26] = datetime(2024, 1, 1 + i % 28) if i % 4 else '17-Jan-24'
+        row[27] = 500 + i
+        row[31] = 3001234567 + i if i % 2 else None
+        sheet.append(row)
+    workbook.save(path)
+
+
+@pytest.mark.parametrize('chunk_rows', [7, 64, 1000])
+def test_streaming_reader_matches_read_excel(tmp_path, chunk_rows):
+    path = tmp_path / 'clients.xlsx'
+    write_workbook(path, 150)
+
+    # Small files take the pd.read_excel path of parse_excel_source
+    expected = server.parse_excel_source(str(path))
+    streamed = server.read_excel_streaming(str(path), chunk_rows=chunk_rows)
+    assert len(expected) == 150 - len(range(5, 150, 17))
+    pd.testing.assert_frame_equal(streamed, expected)
+
+
+def export_rows(rows: int) -> list:
+    """Branch export rows with one cell type per column, so every format can carry them"""
+    width = server.EXCEL_USED_COLUMNS[-1] + 1
+    table = []
+    for i in range(rows):
+        row = [None] * width
+        row[1] = f"{100000 + i}"
+        row[2] = f"Client {i}"
+        row[4] = None if i % 17 == 5 else f"Branch {i % 4}"
+        row[5] = f"CO {i % 6}"
+        row[10] = i * 1.5
+        row[14] = float(i % 9)
+        row[17] = None if i % 5 == 0 else 10.0
+        row[18] = 0.25 * (i % 3)
+        row[21] = 25.75
+        row[23] = datetime(2023, 12, 1 + i % 28)
+        row[26] = None if i % 13 == 0 else datetime(2024, 1, 1 + i % 28)
+        row[27] = 500.0 + i
+        row[31] = f"0300{1234567 + i}" if i % 2 else None
+        table.append(row)
+    return table
+
+
+def export_header(width: int) -> list:
+    return [[f"Column {i}" for i in range(width)], ['Branch export'] + [None] * (width - 1), [None] * width]
+
+
+def write_export(path: Path, rows: list):
+    """Write the rows in the format named by the file suffix"""
+    width = len(rows[0])
+    if path.suffix == '.xlsx':
+        workbook = openpyxl.Workbook()
+        for row in export_header(width) + rows:
+            workbook.active.append(row)
+        workbook.save(path)
+    elif path.suffix == '.csv':
+        # Text exports carry dates as ISO text
+        cell = lambda v: '' if v is None else v.date().isoformat() if isinstance(v, datetime) else v
+        with open(path, 'w', newline='') as f:
+            csv.writer(f).writerows([[cell(v) for v in row] for row in export_header(width) + rows])
+    else:
+        # Columnar exports have no banner rows
+        table = pa.table({f"Column {i}": pa.array([row[i] for row in rows]) for i in range(width)})
+        if path.suffix == '.parquet':
+            pq.write_table(table, path)
+        else:
+            with pa.ipc.new_file(str(path), table.schema) as writer:
+                writer.write_table(table)
+
+
+@pytest.mark.parametrize('suffix', ['.csv', '.parquet', '.arrow'])
+def test_upload_readers_match_the_workbook(tmp_path, suffix):
+    rows = export_rows(120)
+    write_export(tmp_path / 'clients.xlsx', rows)
+    write_export(tmp_path / f"clients{suffix}", rows)
+
+    expected = server.parse_upload_source(str(tmp_path / 'clients.xlsx'), 'clients.xlsx')
+    parsed = server.parse_upload_source(str(tmp_path / f"clients{suffix}"), f"clients{suffix}")
+    assert len(expected) == 120 - len(range(5, 120, 17))
+    pd.testing.assert_frame_equal(parsed, expected)
+    last_month = expected.iloc[::2].reset_index(drop=True)
+    assert_same_metrics(build(parsed, last_month), build(expected, last_month))
+
+
+def test_named_columnar_upload_matches_the_workbook(tmp_path):
+    write_export(tmp_path / 'clients.xlsx', export_rows(120))
+    expected = server.parse_upload_source(str(tmp_path / 'clients.xlsx'), 'clients.xlsx')
+
+    # A Parquet file written from normalized columns is read back by field name
+    pq.write_table(pa.Table.from_pandas(expected, preserve_index=False), tmp_path / 'clients.parquet')
+    parsed = server.parse_upload_source(str(tmp_path / 'clients.parquet'), 'clients.parquet')
+    pd.testing.assert_frame_equal(parsed, expected)
+    assert_same_metrics(build(parsed, expected.iloc[:0]), build(expected, expected.iloc[:0]))
@@ -0,0 +1,115 @@
+"""Offline checks of the snapshot retention policy."""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'backend'))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import server
+from test_metrics import TODAY, YESTERDAY, client_frame
+
+NOW = datetime(2024, 3, 10, 12, 0)
+
+
+def headers(*ages):
+    """Headers newest first, one per age (a timedelta before NOW)"""
+    return [{"_id": i, "snapshot_id": f"s{i}", "timestamp": NOW - age} for i, age in enumerate(sorted(ages))]
+
+
+def ids(rows):
+    return [row["snapshot_id"] for row in rows]
+
+
+@pytest.fixture
+def policy(monkeypatch):
+    def apply(keep_last=0, ttl_days=0, pin_days=0):
+        monkeypatch.setattr(server, 'SNAPSHOT_KEEP_LAST', keep_last)
+        monkeypatch.setattr(server, 'SNAPSHOT_TTL_DAYS', ttl_days)
+        monkeypatch.setattr(server, 'SNAPSHOT_PIN_DAILY_DAYS', pin_days)
+    return apply
+
+
+def test_keeps_the_newest_n(policy):
+    policy(keep_last=3)
+    # The pin window of 0 days still covers today, so the snapshots are all older
+    expired, pinned = server.snapshots_to_prune(headers(*[timedelta(days=1, hours=i) for i in range(6)]), NOW)
+    assert ids(expired) == ['s3', 's4', 's5'] and pinned == []
+
+
+def test_keeps_snapshots_younger_than_the_ttl(policy):
+    policy(keep_last=1, ttl_days=2)
+    rows = headers(timedelta(days=3), timedelta(hours=1), timedelta(days=1), timedelta(days=2, hours=1))
+    expired, pinned = server.snapshots_to_prune(rows, NOW)
+    assert ids(expired) == ['s2', 's3'] and pinned == []
+
+
+def test_pins_the_newest_snapshot_of_each_day(policy):
+    policy(keep_last=1, pin_days=30)
+    rows = headers(timedelta(hours=1), timedelta(hours=2),
+                   timedelta(days=1, hours=1), timedelta(days=1, hours=3),
+                   timedelta(days=2), timedelta(days=40))
+    expired, pinned = server.snapshots_to_prune(rows, NOW)
+    # s1 shares its day with the kept s0; s5 is older than the pin window
+    assert ids(pinned) == ['s2', 's4']
+    assert ids(expired) == ['s1', 's3', 's5']
+
+
+def test_never_prunes_the_current_snapshot(policy):
+    policy(keep_last=1, pin_days=30)
+    rows = headers(timedelta(hours=1), timedelta(hours=2), timedelta(days=1), timedelta(days=40))
+    expired, pinned = server.snapshots_to_prune(rows, NOW, current='s3')
+    assert 's3' not in ids(expired) + ids(pinned)
+    expired, pinned = server.snapshots_to_prune(rows, NOW, current='s2')
+    assert 's2' not in ids(expired) + ids(pinned)
+
+
+def test_keep_last_zero(policy):
+    rows = headers(timedelta(days=1), timedelta(days=5), timedelta(days=50))
+    policy(keep_last=0)
+    assert server.snapshots_to_prune(rows, NOW) == ([], [])
+    # With only a TTL, the newest snapshot still survives it
+    policy(keep_last=0, ttl_days=2)
+    expired, pinned = server.snapshots_to_prune(headers(timedelta(days=3), timedelta(days=4)), NOW)
+    assert ids(expired) == ['s1'] and pinned == []
+
+
+def test_pinned_snapshots_keep_their_history(policy, monkeypatch):
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    monkeypatch.setattr(server, 'db', mongomock_motor.AsyncMongoMockClient()['retention'])
+    monkeypatch.setattr(server, 'SNAPSHOT_STORAGE', 'documents')
+    policy(keep_last=1, pin_days=30)
+
+    async def run():
+        rng = np.random.default_rng(22)
+        snapshot_ids = ['day-3', 'day-2', 'day-1']
+        for age, snapshot_id in zip((3, 2, 1), snapshot_ids):
+            frame = client_frame(rng, 40)
+            metrics = server.compute_group_metrics(frame, frame.iloc[:0], YESTERDAY, TODAY)
+            rows = {view: [m.model_dump() for m in metrics[view].values()] for view in server.GROUP_VIEWS}
+            await server.store_snapshot(snapshot_id, {"totalActiveClients": len(frame)}, rows, frame, YESTERDAY, TODAY)
+            await server.db.dashboard_data.update_one(
+                {"snapshot_id": snapshot_id}, {"$set": {"timestamp": datetime.utcnow() - timedelta(days=age)}}
+            )
+        monkeypatch.setattr(server.snapshot_generation, 'latest', server.SnapshotRef('day-1', {"snapshot_id": 'day-1'}))
+
+        async def history(engine):
+            return [entry.model_dump() for entry in await server.get_metrics_history(
+                view='Branch', keys=None, from_date=None, to_date=None, engine=engine)]
+        before = {engine: await history(engine) for engine in ('mongo', 'python')}
+
+        await server.prune_snapshots()
+        assert set(await server.db.snapshot_clients.distinct("snapshot_id")) == {'day-1'}
+        pruned = await server.db.dashboard_data.find({"clients_pruned": True}).to_list(None)
+        assert sorted(header["snapshot_id"] for header in pruned) == ['day-2', 'day-3']
+        for engine in ('mongo', 'python'):
+            assert await history(engine) == before[engine] == before['python']
+
+    asyncio.run(run())